@@ -1,17 +1,35 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import models, database
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from . import models, database, backplane
 
 # CONFIGURATION
 SECRET_KEY = "urbanplate_secret_key_change_me_in_production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Password hashing pool: "thread", "process" or "inline" (no pool, old behaviour)
+HASH_POOL_KIND = os.getenv("URBANPLATE_HASH_POOL", "thread")
+HASH_POOL_WORKERS = int(os.getenv("URBANPLATE_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.getenv("URBANPLATE_HASH_QUEUE_LIMIT", "64"))
+
+# Principal cache: token -> (claims, user snapshot). Size 0 disables it.
+# Profile changes evict the user's tokens on every worker (the "auth" backplane
+# channel); with the local backplane and several workers, others wait out the TTL.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("URBANPLATE_PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("URBANPLATE_PRINCIPAL_CACHE_TTL", "60"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login") # Pointing to the login route
 
@@ -22,6 +40,56 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# 1b. Hashing Pool: bcrypt is CPU-bound, keep it off the event loop
+class HashPool:
+    def __init__(self, kind: str, workers: int, queue_limit: int):
+        self.kind = kind
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.rejected = 0
+        self.executor: Optional[Executor] = None
+        if kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        elif kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        elif kind != "inline":
+            raise ValueError(f"Unknown hash pool kind: {kind}")
+
+    async def run(self, fn, *args):
+        if self.executor is None:
+            return fn(*args)
+        # Back-pressure: refuse straight away instead of queueing unbounded work
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+hash_pool = HashPool(HASH_POOL_KIND, HASH_POOL_WORKERS, HASH_QUEUE_LIMIT)
+
+def configure_hash_pool(kind: str = HASH_POOL_KIND, workers: int = HASH_POOL_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+    global hash_pool
+    hash_pool.shutdown()
+    hash_pool = HashPool(kind, workers, queue_limit)
+    return hash_pool
+
+async def verify_password_async(plain_password, hashed_password):
+    return await hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await hash_pool.run(get_password_hash, password)
+
 # 2. Token Creation
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -30,22 +98,127 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# 3. Dependency: Get Current User (The Guard)
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# 3. Principal Cache: skip jwt.decode + user lookup for hot tokens
+class PrincipalCache:
+    def __init__(self, max_size: int, ttl_seconds: int, bus=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple] = OrderedDict() # token -> (claims, snapshot, expires_at)
+        self._tokens_by_user: dict[int, set] = {}
+        self.backplane = bus or backplane.bus
+        self.backplane.subscribe("auth", self._invalidate_remote)
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, snapshot, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return claims, snapshot
+
+    def put(self, token: str, claims: dict, user: models.UserDB):
+        if self.max_size <= 0:
+            return
+        # Never outlive the token itself
+        expires_at = min(time.time() + self.ttl_seconds, claims.get("exp", 0))
+        if expires_at <= time.time():
+            return
+        snapshot = models.UserDB(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            hashed_password=user.hashed_password,
+            role=user.role,
+        )
+        make_transient_to_detached(snapshot)
+        self._remove(token)
+        self._entries[token] = (claims, snapshot, expires_at)
+        self._tokens_by_user.setdefault(user.id, set()).add(token)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate_user(self, user_id: int):
+        """Call after committing a username/email/password change."""
+        self._invalidate_local(user_id)
+        await self.backplane.publish("auth", user_id, "")
+
+    def _invalidate_remote(self, room_id: int, payload: str):
+        self._invalidate_local(room_id)
+
+    def _invalidate_local(self, user_id: int):
+        for token in self._tokens_by_user.pop(user_id, ()):
+            self._entries.pop(token, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_user.clear()
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[1].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[1].id]
+
+    def __len__(self):
+        return len(self._entries)
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+async def resolve_principal(token: str, db: AsyncSession) -> Optional[models.UserDB]:
+    """
+    Token -> user attached to `db`, or None if the token is invalid.
+    Shared by the HTTP guard and the chat WebSocket handshake.
+    """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        # merge(load=False) attaches a per-request copy without touching the DB
+        return await db.merge(cached[1], load=False)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            return None
     except JWTError:
-        raise credentials_exception
-        
-    user = db.query(models.UserDB).filter(models.UserDB.username == username).first()
+        return None
+
+    user = await db.scalar(select(models.UserDB).filter(models.UserDB.username == username))
+    if user is not None:
+        principal_cache.put(token, payload, user)
+    return user
+
+# 4. Dependency: Get Current User (The Guard)
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = await resolve_principal(token, db)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+# 5. Order Access: the customer who placed it, or the owner of the restaurant cooking it
+async def order_party(order: models.OrderDB, user: models.UserDB, db: AsyncSession) -> Optional[str]:
+    """'customer', 'restaurant' or None (no access)."""
+    if order.customer_id == user.id:
+        return "customer"
+    if order.restaurant_id is not None:
+        owner_id = await db.scalar(
+            select(models.RestaurantDB.owner_id).filter(models.RestaurantDB.id == order.restaurant_id)
+        )
+        if owner_id == user.id:
+            return "restaurant"
+    return None
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Optional
+from sqlalchemy import delete, func, insert, select
+from . import database, models
+
+logger = logging.getLogger(__name__)
+
+# "local": single process, nothing leaves the worker (default)
+# "sqlite": workers share realtime frames through the realtime_events table
+CHAT_BACKPLANE = os.getenv("URBANPLATE_CHAT_BACKPLANE", "local")
+BACKPLANE_POLL_MS = int(os.getenv("URBANPLATE_BACKPLANE_POLL_MS", "20"))
+BACKPLANE_RETENTION_SECONDS = int(os.getenv("URBANPLATE_BACKPLANE_RETENTION_SECONDS", "60"))
+BACKPLANE_BATCH = 500
+
+# deliver(room_id, payload) - called for frames published by OTHER workers
+Deliver = Callable[[int, str], None]
+
+class LocalBackplane:
+    """In-process only: local delivery is already done by the connection managers."""
+
+    def subscribe(self, channel: str, deliver: Deliver):
+        pass
+
+    async def start(self):
+        pass
+
+    async def publish(self, channel: str, room_id: int, payload: str):
+        pass
+
+    async def publish_many(self, channel: str, frames: list):
+        pass
+
+    async def stop(self):
+        pass
+
+class SQLiteBackplane:
+    """
+    Notification log in the shared database file. Every worker appends the
+    frames it broadcasts and tails the log for frames from other workers.
+    No extra service: all uvicorn workers already open urbanplate.db.
+    One tailer per process serves every channel (chat, order status, ...).
+    """
+
+    def __init__(self, engine=None, poll_ms: int = BACKPLANE_POLL_MS, retention_seconds: int = BACKPLANE_RETENTION_SECONDS):
+        self.engine = engine or database.async_engine
+        self.poll_interval = poll_ms / 1000
+        self.retention_seconds = retention_seconds
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.last_id = 0
+        self.delivered = 0
+        self._subscribers: dict[str, Deliver] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, deliver: Deliver):
+        self._subscribers[channel] = deliver
+
+    async def start(self):
+        if self._task is not None:
+            return
+        async with self.engine.connect() as conn:
+            self.last_id = await conn.scalar(select(func.max(models.RealtimeEventDB.id))) or 0
+        self._task = asyncio.create_task(self._tail())
+
+    async def publish(self, channel: str, room_id: int, payload: str):
+        await self.publish_many(channel, [(room_id, payload)])
+
+    async def publish_many(self, channel: str, frames: list):
+        if not frames:
+            return
+        now = time.time()
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(models.RealtimeEventDB), [
+                {"channel": channel, "room_id": room_id, "payload": payload, "origin": self.origin, "created_at": now}
+                for room_id, payload in frames
+            ])
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _tail(self):
+        events = models.RealtimeEventDB
+        next_prune = time.monotonic()
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    rows = (await conn.execute(
+                        select(events.id, events.channel, events.room_id, events.payload, events.origin)
+                        .filter(events.id > self.last_id)
+                        .order_by(events.id)
+                        .limit(BACKPLANE_BATCH)
+                    )).all()
+                for row in rows:
+                    self.last_id = row.id
+                    deliver = self._subscribers.get(row.channel)
+                    if deliver is not None and row.origin != self.origin:
+                        deliver(row.room_id, row.payload)
+                        self.delivered += 1
+
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + self.retention_seconds / 4
+                    # Never the newest row: ids are rowids, so an empty table would
+                    # hand out ids again that other workers have already tailed past
+                    async with self.engine.begin() as conn:
+                        await conn.execute(delete(events).filter(
+                            events.created_at < time.time() - self.retention_seconds,
+                            events.id < select(func.max(events.id)).scalar_subquery(),
+                        ))
+                if len(rows) == BACKPLANE_BATCH:
+                    continue # Behind: drain without sleeping
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Realtime backplane poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+def create_backplane(kind: str = CHAT_BACKPLANE):
+    if kind == "local":
+        return LocalBackplane()
+    if kind == "sqlite":
+        return SQLiteBackplane()
+    raise ValueError(f"Unknown chat backplane: {kind}")
+
+# Shared by every connection manager in this process
+bus = create_backplane()
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from . import backplane
+
+# Versioned response cache for the public catalog (menu feed).
+# Every write bumps the restaurant's version and the global one. A cached body is
+# only served while the version it was built under is still current. Other workers
+# hear about writes on the "catalog" backplane channel; with the local backplane and
+# several workers they don't, so entries also expire after CATALOG_CACHE_MAX_AGE_SECONDS.
+CATALOG_CACHE_SIZE = int(os.getenv("URBANPLATE_CATALOG_CACHE_SIZE", "1024"))
+CATALOG_CACHE_MAX_AGE_SECONDS = float(os.getenv("URBANPLATE_CATALOG_CACHE_MAX_AGE", "30"))
+
+def make_etag(body: bytes) -> str:
+    # Content hash, so every worker hands out the same ETag for the same page
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+class CatalogCache:
+    def __init__(self, max_size: int, max_age_seconds: float = CATALOG_CACHE_MAX_AGE_SECONDS, bus=None):
+        self.max_size = max_size
+        self.max_age_seconds = max_age_seconds
+        self.global_version = 0
+        self.restaurant_versions: dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict() # key -> (version, etag, body, expires_at)
+        self.backplane = bus or backplane.bus
+        self.backplane.subscribe("catalog", self._bump_remote)
+
+    def version(self, restaurant_id: Optional[int] = None) -> int:
+        # Restaurant-scoped pages only go stale when that restaurant changes
+        if restaurant_id is None:
+            return self.global_version
+        return self.restaurant_versions.get(restaurant_id, 0)
+
+    def get(self, key: tuple, version: int):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version or entry[3] <= time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: tuple, version: int, etag: str, body: bytes):
+        # `version` must be read BEFORE the query, so a write racing the build
+        # leaves the entry already stale instead of caching old data as new
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (version, etag, body, time.monotonic() + self.max_age_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def bump(self, restaurant_id: Optional[int]):
+        """Call after committing any change that shows up in the catalog."""
+        self._bump_local(restaurant_id)
+        await self.backplane.publish("catalog", restaurant_id or 0, "")
+
+    def _bump_remote(self, room_id: int, payload: str):
+        self._bump_local(room_id or None)
+
+    def _bump_local(self, restaurant_id: Optional[int]):
+        self.global_version += 1
+        if restaurant_id is not None:
+            self.restaurant_versions[restaurant_id] = self.restaurant_versions.get(restaurant_id, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "global_version": self.global_version,
+        }
+
+cache = CatalogCache(CATALOG_CACHE_SIZE)
@@ -0,0 +1,105 @@
+import asyncio
+import os
+from typing import Optional
+from sqlalchemy import delete, insert, select
+from . import database, models
+
+# Group commit: chat lines are queued and written in one transaction per batch,
+# flushed when the batch is full or after a few milliseconds.
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("URBANPLATE_CHAT_WRITE_BATCH", "256"))
+CHAT_WRITE_FLUSH_MS = float(os.getenv("URBANPLATE_CHAT_WRITE_FLUSH_MS", "5"))
+CHAT_WRITE_QUEUE_LIMIT = int(os.getenv("URBANPLATE_CHAT_WRITE_QUEUE", "1024")) # Submitters wait beyond this
+CLOSED_STATUSES = ("delivered", "cancelled") # Chat is wiped when an order gets here
+
+# Dedicated connection: the writer never queues behind request sessions for a pool slot
+writer_engine = database.create_async_sqlite_engine(pool_size=1, max_overflow=0)
+
+class ChatWriter:
+    def __init__(self, batch_size: int = CHAT_WRITE_BATCH_SIZE, flush_ms: float = CHAT_WRITE_FLUSH_MS, engine=None,
+                 queue_limit: int = CHAT_WRITE_QUEUE_LIMIT):
+        self.engine = engine or writer_engine
+        self.batch_size = batch_size
+        self.queue_limit = queue_limit
+        self.flush_interval = flush_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.batches = 0
+        self.messages = 0
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def depth(self) -> int:
+        """Messages waiting for the next batch."""
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def submit(self, order_id: int, sender_type: str, message: str, timestamp: str) -> Optional[int]:
+        """
+        Queue one chat line and wait until it is committed. Returns the new row id,
+        or None if the order was delivered or cancelled by then (nothing written).
+        A single writer task drains the queue in FIFO order, so ids (and history
+        order) follow submission order within every order_id.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            # Lazily bound to the serving loop (queues can't cross event loops)
+            self._loop = loop
+            self.queue = asyncio.Queue(maxsize=self.queue_limit)
+            self._task = loop.create_task(self._run(self.queue))
+        done = loop.create_future()
+        row = {"order_id": order_id, "sender_type": sender_type, "message": message, "timestamp": timestamp}
+        await self.queue.put((row, done))
+        return await done
+
+    async def _run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(
+                    insert(models.ChatMessageDB)
+                    .returning(models.ChatMessageDB.id, sort_by_parameter_order=True),
+                    [row for row, _ in batch],
+                )
+                ids = result.scalars().all()
+                # The INSERT holds the write lock, so this sees every status change
+                # committed before it. Lines of orders closed meanwhile would
+                # outlive the chat wipe: take them back out.
+                closed = set((await conn.execute(
+                    select(models.OrderDB.id).filter(
+                        models.OrderDB.id.in_({row["order_id"] for row, _ in batch}),
+                        models.OrderDB.status.in_(CLOSED_STATUSES),
+                    )
+                )).scalars())
+                if closed:
+                    await conn.execute(delete(models.ChatMessageDB).filter(
+                        models.ChatMessageDB.id.in_(ids), models.ChatMessageDB.order_id.in_(closed)
+                    ))
+                    ids = [None if row["order_id"] in closed else new_id for (row, _), new_id in zip(batch, ids)]
+        except Exception as exc:
+            for _, done in batch:
+                if not done.done():
+                    done.set_exception(exc)
+            return
+        self.batches += 1
+        self.messages += len(batch)
+        for (_, done), new_id in zip(batch, ids):
+            if not done.done():
+                done.set_result(new_id)
+
+writer = ChatWriter()
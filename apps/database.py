@@ -1,21 +1,109 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # 1. Connect to the file in the parent directory
-SQLALCHEMY_DATABASE_URL = "sqlite:///./urbanplate.db"
+# (URBANPLATE_DB_PATH lets benchmarks/scripts point at a scratch file)
+DB_PATH = os.getenv("URBANPLATE_DB_PATH", "./urbanplate.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
 
-engine = create_engine(
+# --- STORAGE PROFILES ---
+# PRAGMAs applied to every new connection. In WAL mode readers never block the
+# writer (and vice versa); the rollback journal ("legacy") locks the whole file.
+#   legacy  - SQLite defaults, what the app used to run with
+#   wal     - WAL + synchronous=NORMAL: durable on app crash, may lose the last
+#             commits on power loss (default)
+#   durable - WAL + synchronous=FULL: fsync on every commit
+#   fast    - WAL + synchronous=OFF + bigger caches: scratch/benchmark databases only
+STORAGE_PROFILES = {
+    "legacy": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000, # KiB
+        "mmap_size": 64 * 1024 * 1024,
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+STORAGE_PROFILE = os.getenv("URBANPLATE_STORAGE_PROFILE", "wal")
+if STORAGE_PROFILE not in STORAGE_PROFILES:
+    raise ValueError(f"Unknown storage profile: {STORAGE_PROFILE}")
+
+# Single knobs win over the profile, e.g. URBANPLATE_SQLITE_SYNCHRONOUS=FULL
+SQLITE_PRAGMAS = dict(STORAGE_PROFILES[STORAGE_PROFILE])
+for pragma in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size"):
+    override = os.getenv(f"URBANPLATE_SQLITE_{pragma.upper()}")
+    if override:
+        SQLITE_PRAGMAS[pragma] = override
+
+# Connection pools (per worker process)
+DB_POOL_SIZE = int(os.getenv("URBANPLATE_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("URBANPLATE_DB_MAX_OVERFLOW", "10"))
+DB_READ_POOL_SIZE = int(os.getenv("URBANPLATE_DB_READ_POOL_SIZE", "10"))
+DB_READ_MAX_OVERFLOW = int(os.getenv("URBANPLATE_DB_READ_MAX_OVERFLOW", "10"))
+
+def apply_pragmas(engine, read_only: bool = False):
+    """Run the profile's PRAGMAs on every connection the engine opens."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON") # Writes fail loudly instead of taking the lock
+        cursor.close()
+    return engine
+
+def create_async_sqlite_engine(read_only: bool = False, **pool_options):
+    return apply_pragmas(create_async_engine(ASYNC_DATABASE_URL, **pool_options), read_only=read_only)
+
+# Sync engine: only for offline work (create_all, seeding scripts)
+engine = apply_pragmas(create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: used by every request handler so DB I/O never blocks the event loop
+async_engine = create_async_sqlite_engine(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Read-only engine: its own pool, so GETs never queue behind connections held by writers
+read_engine = create_async_sqlite_engine(read_only=True, pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_MAX_OVERFLOW)
+ReadSessionLocal = async_sessionmaker(
+    read_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 # 2. Dependency: Used by endpoints to open/close DB connections
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Same, for endpoints that only read
+async def get_read_db():
+    async with ReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
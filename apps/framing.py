@@ -0,0 +1,79 @@
+import json
+import os
+import zlib
+from typing import Optional, Union
+
+# Wire formats for the realtime WebSockets (chat, order status, kitchen, tracking).
+# The client lists the ones it speaks in Sec-WebSocket-Protocol, best first.
+# Without one it gets JSON text frames, same as always.
+#   urbanplate.json              JSON text frames
+#   urbanplate.msgpack           MessagePack binary frames
+#   urbanplate.json+deflate      raw DEFLATE of the JSON, binary frames
+#   urbanplate.msgpack+deflate   raw DEFLATE of the MessagePack, binary frames
+# Frames are encoded once per broadcast for each format in use, then shared by
+# every socket in the room. Transport-level permessage-deflate (RFC 7692) is
+# negotiated by uvicorn itself (--ws-per-message-deflate, on by default) and
+# costs one compression per socket. Clients should use one or the other.
+try:
+    import msgpack
+except ImportError:  # Optional: the msgpack formats are simply not offered
+    msgpack = None
+
+WS_DEFLATE_LEVEL = int(os.getenv("URBANPLATE_WS_DEFLATE_LEVEL", "6"))
+WS_MAX_INBOUND_BYTES = 64 * 1024  # Size cap for decoded client frames
+
+JSON = "urbanplate.json"
+MSGPACK = "urbanplate.msgpack"
+FORMATS = (JSON, MSGPACK, JSON + "+deflate", MSGPACK + "+deflate")
+
+
+def supported(fmt: str) -> bool:
+    return fmt in FORMATS and (msgpack is not None or not fmt.startswith(MSGPACK))
+
+
+def negotiate(offered: list) -> Optional[str]:
+    """The first subprotocol offered that we speak, None for plain JSON text."""
+    return next((fmt for fmt in offered if supported(fmt)), None)
+
+
+def json_text(message) -> str:
+    # Same format as WebSocket.send_json
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode(fmt: Optional[str], message, text: Optional[str] = None) -> Union[str, bytes]:
+    """One frame of `message` in `fmt`. Pass `text` if the JSON text is already at hand."""
+    if fmt is None or fmt == JSON:
+        return text if text is not None else json_text(message)
+    if fmt.startswith(MSGPACK):
+        payload = msgpack.packb(message)
+    else:
+        payload = (text if text is not None else json_text(message)).encode()
+    if fmt.endswith("+deflate"):
+        # Raw DEFLATE (wbits=-15); zlib.compress() only takes wbits from Python 3.11
+        compressor = zlib.compressobj(WS_DEFLATE_LEVEL, zlib.DEFLATED, -15)
+        payload = compressor.compress(payload) + compressor.flush()
+    return payload
+
+
+def decode(fmt: Optional[str], data: bytes):
+    """A binary frame from the client. Raises ValueError if it is not valid in `fmt`."""
+    if fmt is not None and fmt.endswith("+deflate"):
+        inflater = zlib.decompressobj(wbits=-15)
+        try:
+            data = inflater.decompress(data, WS_MAX_INBOUND_BYTES)
+        except zlib.error as e:
+            raise ValueError(f"bad deflate frame: {e}")
+        if inflater.unconsumed_tail:
+            raise ValueError("frame too large")
+    if len(data) > WS_MAX_INBOUND_BYTES:
+        raise ValueError("frame too large")
+    if fmt is not None and fmt.startswith(MSGPACK):
+        # Same cap as inflating: a declared length must not allocate past it
+        limit = WS_MAX_INBOUND_BYTES
+        try:
+            return msgpack.unpackb(data, max_str_len=limit, max_bin_len=limit, max_array_len=limit,
+                                   max_map_len=limit, max_ext_len=limit)
+        except Exception as e:  # Not all of msgpack's errors are ValueErrors
+            raise ValueError(f"bad msgpack frame: {e}")
+    return json.loads(data)
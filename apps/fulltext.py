@@ -0,0 +1,82 @@
+import re
+from sqlalchemy import text
+
+# FTS5 indexes over the catalogue. External-content tables: the text stays in
+# menu_items/restaurants, FTS only keeps the inverted index. Triggers apply
+# every insert/update/delete incrementally, so the CRUD handlers need no changes.
+FULLTEXT_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS menu_items_fts USING fts5(
+        name, description,
+        content='menu_items', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_fts USING fts5(
+        name, cuisine_type,
+        content='restaurants', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    # --- menu_items ---
+    """
+    CREATE TRIGGER IF NOT EXISTS menu_items_fts_insert AFTER INSERT ON menu_items BEGIN
+        INSERT INTO menu_items_fts(rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS menu_items_fts_delete AFTER DELETE ON menu_items BEGIN
+        INSERT INTO menu_items_fts(menu_items_fts, rowid, name, description)
+        VALUES ('delete', OLD.id, OLD.name, OLD.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS menu_items_fts_update AFTER UPDATE OF name, description ON menu_items BEGIN
+        INSERT INTO menu_items_fts(menu_items_fts, rowid, name, description)
+        VALUES ('delete', OLD.id, OLD.name, OLD.description);
+        INSERT INTO menu_items_fts(rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+    END
+    """,
+    # --- restaurants ---
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_fts_insert AFTER INSERT ON restaurants BEGIN
+        INSERT INTO restaurants_fts(rowid, name, cuisine_type) VALUES (NEW.id, NEW.name, NEW.cuisine_type);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_fts_delete AFTER DELETE ON restaurants BEGIN
+        INSERT INTO restaurants_fts(restaurants_fts, rowid, name, cuisine_type)
+        VALUES ('delete', OLD.id, OLD.name, OLD.cuisine_type);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_fts_update AFTER UPDATE OF name, cuisine_type ON restaurants BEGIN
+        INSERT INTO restaurants_fts(restaurants_fts, rowid, name, cuisine_type)
+        VALUES ('delete', OLD.id, OLD.name, OLD.cuisine_type);
+        INSERT INTO restaurants_fts(rowid, name, cuisine_type) VALUES (NEW.id, NEW.name, NEW.cuisine_type);
+    END
+    """,
+]
+
+def create_fulltext_index(conn):
+    # Runs inside a migration transaction (see apps/migrations.py)
+    # First run on an existing database: build the index from current rows
+    existed = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE name = 'menu_items_fts'"
+    )).first()
+    for ddl in FULLTEXT_INDEX_DDL:
+        conn.execute(text(ddl))
+    if not existed:
+        conn.execute(text("INSERT INTO menu_items_fts(menu_items_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO restaurants_fts(restaurants_fts) VALUES ('rebuild')"))
+
+# --- QUERY BUILDING ---
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def to_match_query(q: str) -> str:
+    """
+    User text -> safe FTS5 MATCH expression.
+    Every word becomes a quoted prefix term, all terms must match ("chick tik" finds "Chicken Tikka").
+    """
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(q.lower()))
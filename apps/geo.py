@@ -0,0 +1,76 @@
+import math
+from sqlalchemy import Column, Float, Integer, MetaData, Table, text
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+# R*Tree over restaurant coordinates. It is a virtual table, so it lives in its
+# own MetaData (create_all must not try to build it) and is filled by triggers.
+spatial_metadata = MetaData()
+
+restaurants_rtree = Table(
+    "restaurants_rtree",
+    spatial_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("min_lat", Float),
+    Column("max_lat", Float),
+    Column("min_lng", Float),
+    Column("max_lng", Float),
+)
+
+SPATIAL_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_rtree
+    USING rtree(id, min_lat, max_lat, min_lng, max_lng)
+    """,
+    # Keep the index in sync with restaurant create/update/delete
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_rtree_insert AFTER INSERT ON restaurants
+    WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO restaurants_rtree
+        VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_rtree_update AFTER UPDATE OF latitude, longitude ON restaurants
+    BEGIN
+        DELETE FROM restaurants_rtree WHERE id = OLD.id;
+        INSERT INTO restaurants_rtree
+        SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+        WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_rtree_delete AFTER DELETE ON restaurants
+    BEGIN
+        DELETE FROM restaurants_rtree WHERE id = OLD.id;
+    END
+    """,
+    # Backfill rows that existed before the index did
+    """
+    INSERT OR IGNORE INTO restaurants_rtree
+    SELECT id, latitude, latitude, longitude, longitude FROM restaurants
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    """,
+]
+
+def create_spatial_index(conn):
+    # Runs inside a migration transaction (see apps/migrations.py)
+    for ddl in SPATIAL_INDEX_DDL:
+        conn.execute(text(ddl))
+
+# --- MATH HELPERS ---
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def bounding_box(lat: float, lng: float, radius_km: float):
+    """(min_lat, max_lat, min_lng, max_lng) of a box that contains the search circle."""
+    d_lat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(lat))
+    d_lng = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+    return lat - d_lat, lat + d_lat, lng - d_lng, lng + d_lng
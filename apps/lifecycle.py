@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+from sqlalchemy import func, select, update
+from . import database, models
+
+logger = logging.getLogger(__name__)
+
+# Pending -> Cooking -> Ready is automatic, Ready -> Delivered is confirmed by a human.
+# Cancel is allowed until the food is ready.
+TRANSITIONS = {
+    "pending": {"cooking", "cancelled"},
+    "cooking": {"ready", "cancelled"},
+    "ready": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+
+ACCEPT_SECONDS = float(os.getenv("URBANPLATE_ORDER_ACCEPT_SECONDS", "5"))
+COOK_SECONDS = float(os.getenv("URBANPLATE_ORDER_COOK_SECONDS", "600"))
+
+# status -> (next status, seconds spent in status before the engine moves it on)
+AUTO_ADVANCE = {
+    "pending": ("cooking", ACCEPT_SECONDS),
+    "cooking": ("ready", COOK_SECONDS),
+}
+
+LIFECYCLE_BATCH_SIZE = 1000
+LIFECYCLE_MAX_SLEEP_SECONDS = 1.0 # Also how fast other workers' new orders are noticed
+
+def can_transition(old: str, new: str) -> bool:
+    return new in TRANSITIONS.get(old, set())
+
+def next_transition_at(status: str, now: Optional[float] = None) -> Optional[float]:
+    """When the engine should move an order that just entered `status` (None = never)."""
+    if status not in AUTO_ADVANCE:
+        return None
+    return (now or time.time()) + AUTO_ADVANCE[status][1]
+
+class LifecycleEngine:
+    """
+    One timer per worker. The schedule itself is persisted in
+    orders.next_transition_at, and its index works as the timer heap: the engine
+    sleeps until MIN(next_transition_at), then advances every due order with a few
+    batched UPDATEs. Memory does not grow with the number of in-flight orders,
+    restarts lose nothing, and the status-guarded UPDATEs make several workers safe.
+    """
+
+    def __init__(self, engine=None, batch_size: int = LIFECYCLE_BATCH_SIZE, max_sleep: float = LIFECYCLE_MAX_SLEEP_SECONDS):
+        self.engine = engine or database.async_engine
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.advanced = 0
+        self.listeners = [] # async fn(changes) called after every pass that moved orders
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        # New or rescheduled order: re-read the earliest due time now
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def advance_due(self, now: Optional[float] = None) -> list:
+        """Advance every order whose timer has expired. Returns [(order_id, customer_id, restaurant_id, new_status)]."""
+        now = now or time.time()
+        orders = models.OrderDB
+        changed = []
+        # Later stages first, so an order moves at most one step per pass
+        for old, (new, _) in reversed(list(AUTO_ADVANCE.items())):
+            while True:
+                due_ids = (
+                    select(orders.id)
+                    .filter(orders.status == old, orders.next_transition_at <= now)
+                    .order_by(orders.next_transition_at)
+                    .limit(self.batch_size)
+                    .scalar_subquery()
+                )
+                async with self.engine.begin() as conn:
+                    rows = (await conn.execute(
+                        update(orders)
+                        .filter(orders.id.in_(due_ids), orders.status == old)
+                        .values(status=new, next_transition_at=next_transition_at(new, now))
+                        .returning(orders.id, orders.customer_id, orders.restaurant_id)
+                    )).all()
+                changed.extend((row.id, row.customer_id, row.restaurant_id, new) for row in rows)
+                if len(rows) < self.batch_size:
+                    break
+        self.advanced += len(changed)
+        return changed
+
+    async def next_due_at(self) -> Optional[float]:
+        async with self.engine.connect() as conn:
+            return await conn.scalar(select(func.min(models.OrderDB.next_transition_at)))
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                changed = await self.advance_due()
+                if changed:
+                    for listener in self.listeners:
+                        await listener(changed)
+                due = await self.next_due_at()
+                delay = self.max_sleep if due is None else min(self.max_sleep, max(0.0, due - time.time()))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Order lifecycle tick failed")
+                delay = self.max_sleep
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+engine = LifecycleEngine()
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+from sqlalchemy.dialects.sqlite import insert
+from . import database, geo, metrics, models
+
+logger = logging.getLogger(__name__)
+
+# Live location ingest. GPS pings arrive every few seconds per active order, far
+# too many to write one by one. The latest position per user is kept in memory:
+#   - pings closer than LOCATION_MIN_MOVE_METERS to the last kept one are jitter and dropped
+#   - changed positions are upserted into user_locations in one batch every LOCATION_FLUSH_SECONDS
+#   - watchers of an order get at most one frame per user every LOCATION_STREAM_SECONDS
+LOCATION_MIN_MOVE_METERS = float(os.getenv("URBANPLATE_LOCATION_MIN_MOVE_METERS", "10"))
+LOCATION_FLUSH_SECONDS = float(os.getenv("URBANPLATE_LOCATION_FLUSH_SECONDS", "5"))
+LOCATION_STREAM_SECONDS = float(os.getenv("URBANPLATE_LOCATION_STREAM_SECONDS", "2"))
+LOCATION_FLUSH_BATCH = 500 # Rows per upsert statement
+
+pings = metrics.registry.add(metrics.Counter(
+    "urbanplate_location_pings_total", "Location pings received, by outcome.", ("result",)))
+flushed = metrics.registry.add(metrics.Counter(
+    "urbanplate_location_flushed_total", "Positions written to user_locations."))
+
+class LocationStore:
+    """
+    user_id -> (latitude, longitude, recorded_at) of the last kept ping. Memory is
+    one tuple per user who pinged since start. Watchers are fed through `listeners`
+    (same as the lifecycle engine): async fn([(order_id, user_id, lat, lng, recorded_at)]).
+    """
+
+    def __init__(self, min_move_m: float = LOCATION_MIN_MOVE_METERS, flush_seconds: float = LOCATION_FLUSH_SECONDS,
+                 stream_seconds: float = LOCATION_STREAM_SECONDS, engine=None):
+        self.engine = engine or database.async_engine
+        self.min_move_km = min_move_m / 1000
+        self.flush_seconds = flush_seconds
+        self.stream_seconds = stream_seconds
+        self.latest: dict[int, tuple] = {}
+        self.listeners = []
+        self.sharing: dict[int, set] = {} # order_id -> users streaming their position to it
+        self._dirty: set = set() # Users whose position is not in the database yet
+        self._pending: dict[tuple, tuple] = {} # (order_id, user_id) -> position not streamed yet
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def position(self, user_id: int) -> Optional[tuple]:
+        """(latitude, longitude) if this worker holds a live position for the user."""
+        entry = self.latest.get(user_id)
+        return entry[:2] if entry else None
+
+    def ingest(self, user_id: int, latitude: float, longitude: float,
+               recorded_at: Optional[float] = None, order_id: Optional[int] = None) -> bool:
+        """
+        Keep one ping. False if it was dropped (older than what we have, or jitter).
+        With order_id, the position is also streamed to the watchers of that order.
+        """
+        self._ensure_running()
+        recorded_at = min(recorded_at or time.time(), time.time()) # A clock ahead of ours would freeze the user
+        last = self.latest.get(user_id)
+        if order_id is not None and user_id not in self.sharing.setdefault(order_id, set()):
+            # First ping for this order: watchers see where the user is even if it is not moving
+            self.sharing[order_id].add(user_id)
+            if last is not None:
+                self._pending[(order_id, user_id)] = last
+        if last is not None:
+            if recorded_at <= last[2]:
+                pings.inc("stale")
+                return False
+            if geo.haversine_km(last[0], last[1], latitude, longitude) < self.min_move_km:
+                pings.inc("jitter")
+                return False
+        position = self.latest[user_id] = (latitude, longitude, recorded_at)
+        self._dirty.add(user_id)
+        if order_id is not None:
+            self._pending[(order_id, user_id)] = position
+        pings.inc("accepted")
+        return True
+
+    def order_positions(self, order_id: int) -> list:
+        """[(user_id, latitude, longitude, recorded_at)] of everyone sharing with this order."""
+        return [
+            (user_id, *self.latest[user_id])
+            for user_id in self.sharing.get(order_id, ()) if user_id in self.latest
+        ]
+
+    def forget_order(self, order_id: int):
+        """The order is closed: stop streaming positions to it."""
+        self.sharing.pop(order_id, None)
+        for key in [key for key in self._pending if key[0] == order_id]:
+            del self._pending[key]
+
+    def remember(self, user_id: int, latitude: Optional[float], longitude: Optional[float]):
+        """A position that was just written to the database directly (nothing to flush)."""
+        self._dirty.discard(user_id)
+        if latitude is None or longitude is None:
+            self.latest.pop(user_id, None)
+        else:
+            # Keep the device time of the last ping: our clock may be ahead of the phone's
+            last = self.latest.get(user_id)
+            self.latest[user_id] = (latitude, longitude, last[2] if last else 0.0)
+
+    def _ensure_running(self):
+        # Lazily bound to the serving loop, like the chat writer
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        next_flush = time.monotonic() + self.flush_seconds
+        while True:
+            await asyncio.sleep(self.stream_seconds)
+            await self.publish()
+            if time.monotonic() >= next_flush:
+                await self.flush()
+                next_flush = time.monotonic() + self.flush_seconds
+
+    async def publish(self):
+        """Stream the newest position of every (order, user) that moved since the last tick."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        updates = [(order_id, user_id, *position) for (order_id, user_id), position in pending.items()]
+        for listener in self.listeners:
+            try:
+                await listener(updates)
+            except Exception:
+                logger.exception("location listener failed")
+
+    async def flush(self):
+        """Upsert every position that changed since the last flush. Safe to call any time."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rows = [
+            {"user_id": user_id, "latitude": self.latest[user_id][0], "longitude": self.latest[user_id][1]}
+            for user_id in dirty if user_id in self.latest
+        ]
+        stmt = insert(models.UserLocationDB)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.UserLocationDB.user_id],
+            set_={"latitude": stmt.excluded.latitude, "longitude": stmt.excluded.longitude},
+        )
+        try:
+            async with self.engine.begin() as conn:
+                for i in range(0, len(rows), LOCATION_FLUSH_BATCH):
+                    await conn.execute(stmt, rows[i:i + LOCATION_FLUSH_BATCH])
+        except Exception:
+            self._dirty |= dirty # Retried on the next flush
+            logger.exception("location flush failed")
+            return
+        flushed.inc(amount=len(rows))
+
+    async def stop(self):
+        """Cancel the background task and write out what is still in memory."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+store = LocationStore()
+
+metrics.registry.add(metrics.Gauge(
+    "urbanplate_location_users", "Users with a live position in memory, and how many are not flushed yet.", ("state",),
+    lambda: [(("live",), len(store.latest)), (("unflushed",), len(store._dirty))]))
@@ -1,17 +1,52 @@
-from fastapi import FastAPI
-from . import models, database
-from .routers import users, orders, restaurants, chat # Import 'chat'
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from . import migrations, lifecycle, backplane, metrics, database, chat_writer, ratelimit, ranking, locations
+from .routers import users, orders, restaurants, chat, search, tracking # Import 'chat'
 
-# Create all tables (Including the new ChatMessageDB)
-models.Base.metadata.create_all(bind=database.engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tables, columns & indexes (incl. R*Tree and FTS5) - see apps/migrations.py
+    migrations.migrate()
+    lifecycle.engine.start() # Pending -> Cooking -> Ready timers
+    await backplane.bus.start() # Cross-worker chat, order status & catalog invalidation
+    await ranking.snapshot.sync() # Home feed arrays, loaded before the first request needs them
+    yield
+    await lifecycle.engine.stop()
+    await locations.store.stop() # Write out positions still only in memory
+    await backplane.bus.stop()
 
-app = FastAPI(title="UrbanPlate Modular API")
+app = FastAPI(title="UrbanPlate Modular API", lifespan=lifespan)
+
+# Observability: per-route latency & query counts, DB engines, open sockets
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(database.async_engine, "write")
+metrics.instrument_engine(database.read_engine, "read")
+metrics.instrument_engine(chat_writer.writer_engine, "chat_writer")
+metrics.track_connections(chat.manager, "chat")
+metrics.track_connections(orders.status_manager, "order_status")
+metrics.track_connections(orders.kitchen_manager, "kitchen")
+metrics.track_connections(tracking.watch_manager, "location")
+
+# Admission control: write latency feeds the load shedder (limits in apps/ratelimit.py)
+ratelimit.shedder.watch_engine(database.async_engine)
+ratelimit.shedder.watch_engine(chat_writer.writer_engine)
 
 app.include_router(users.router)
 app.include_router(orders.router)
 app.include_router(restaurants.router)
 app.include_router(chat.router) # Plug in the Chat
+app.include_router(search.router)
+app.include_router(tracking.router)
 
 @app.get("/")
 def root():
-    return {"message": "UrbanPlate Backend is Running properly!"}
\ No newline at end of file
+    return {"message": "UrbanPlate Backend is Running properly!"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    # Prometheus scrape target (text format 0.0.4)
+    if metrics.METRICS_TOKEN and authorization != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
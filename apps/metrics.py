@@ -0,0 +1,182 @@
+import bisect
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+from sqlalchemy import event
+
+# In-process metrics, exposed at GET /metrics in the Prometheus text format.
+# No client library: a handful of counters and fixed-bucket histograms keyed by
+# label tuples. Recording is a few dict lookups, cheap enough to leave on.
+METRICS_TOKEN = os.getenv("URBANPLATE_METRICS_TOKEN") # If set, /metrics wants "Authorization: Bearer <token>"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in self.values.items()]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = buckets
+        self.series: dict[tuple, list] = {} # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self.series.items():
+            names = self.label_names + ("le",)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    """Read at scrape time: collect() returns [(label values, value)]."""
+
+    def __init__(self, name: str, help: str, labels: tuple, collect: Callable[[], list]):
+        self.name, self.help, self.label_names = name, help, labels
+        self.collect = collect
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in self.collect()]
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.add(Counter(
+    "urbanplate_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")))
+http_latency = registry.add(Histogram(
+    "urbanplate_http_request_duration_seconds", "HTTP request latency.", ("method", "route")))
+http_queries = registry.add(Histogram(
+    "urbanplate_http_request_db_queries", "SQL statements issued per HTTP request.", ("method", "route"), QUERY_COUNT_BUCKETS))
+http_db_time = registry.add(Histogram(
+    "urbanplate_http_request_db_seconds", "Time spent in SQL per HTTP request.", ("method", "route")))
+db_queries = registry.add(Counter(
+    "urbanplate_db_queries_total", "SQL statements executed.", ("engine",)))
+db_time = registry.add(Counter(
+    "urbanplate_db_seconds_total", "Time spent executing SQL.", ("engine",)))
+db_commits = registry.add(Counter(
+    "urbanplate_db_commits_total", "Committed transactions.", ("engine",)))
+
+# --- PER-REQUEST DB ACCOUNTING ---
+# [queries, seconds] of the request being served; SQLAlchemy's async layer runs
+# the sync engine events in the caller's context, so they land on the right request.
+_request_db: ContextVar[Optional[list]] = ContextVar("urbanplate_request_db", default=None)
+
+def instrument_engine(engine, name: str):
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("urbanplate_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["urbanplate_query_start"].pop()
+        db_queries.inc(name)
+        db_time.inc(name, amount=elapsed)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    @event.listens_for(sync_engine, "commit")
+    def _commit(conn):
+        db_commits.inc(name)
+
+# --- WEBSOCKETS ---
+_ws_managers: dict = {} # name -> realtime.ConnectionManager
+
+def track_connections(manager, name: str):
+    """Report open sockets per room of a realtime.ConnectionManager (read at scrape time)."""
+    _ws_managers[name] = manager
+
+registry.add(Gauge(
+    "urbanplate_ws_connections", "Open WebSockets per room.", ("manager", "room"),
+    lambda: [
+        ((name, room), len(conns))
+        for name, manager in _ws_managers.items()
+        for room, conns in manager.active_connections.items()
+    ],
+))
+
+# --- MIDDLEWARE ---
+class MetricsMiddleware:
+    """Plain ASGI (no BaseHTTPMiddleware): streaming responses and WebSockets pass straight through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+            # Route template, not the raw path: /orders/{order_id}, never /orders/123
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, route, status_code)
+            http_latency.observe(elapsed, method, route)
+            http_queries.observe(stats[0], method, route)
+            http_db_time.observe(stats[1], method, route)
@@ -0,0 +1,252 @@
+"""
+Versioned schema migrations for urbanplate.db.
+
+create_all() only creates missing tables, so existing databases never gained new
+columns or indexes. Each migration below runs once per database and is recorded
+in schema_migrations. Startup (the lifespan hook in main.py) applies whatever is
+pending; workers that start together queue on SQLite's write lock and then find
+nothing left to do.
+
+    python -m apps.migrations            # apply pending migrations
+    python -m apps.migrations --status   # list applied / pending
+    python -m apps.migrations --check    # EXPLAIN QUERY PLAN of the hot queries + migration lock wait
+
+To change the schema, append a migration with the next version number. Keep it
+online-friendly: ADD COLUMN and CREATE INDEX are fine, table rebuilds are not.
+"""
+import argparse
+import logging
+import sys
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+from . import database, models, geo, fulltext
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_TIMEOUT_SECONDS = 60 # Another worker may be building an index
+
+# --- HELPERS ---
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _create_index(conn, name: str, table: str, columns: str):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+# --- MIGRATIONS ---
+def _baseline(conn):
+    # Fresh database: every table as models.py defines it. Existing database: only the missing tables.
+    models.Base.metadata.create_all(conn)
+
+def _backfill_columns(conn):
+    # Columns added to models.py after the first databases were created
+    _add_column(conn, "users", "role", "VARCHAR DEFAULT 'customer'")
+    _add_column(conn, "orders", "next_transition_at", "FLOAT")
+    _add_column(conn, "orders", "total_price", "FLOAT")
+
+def _hot_path_indexes(conn):
+    _create_index(conn, "ix_orders_customer_id_id", "orders", "customer_id, id")
+    _create_index(conn, "ix_orders_next_transition_at", "orders", "next_transition_at")
+    _create_index(conn, "ix_chat_messages_order_id_id", "chat_messages", "order_id, id")
+    _create_index(conn, "ix_menu_items_restaurant_id", "menu_items", "restaurant_id")
+    _create_index(conn, "ix_restaurants_owner_id", "restaurants", "owner_id")
+    _create_index(conn, "ix_order_lines_order_id", "order_lines", "order_id")
+    _create_index(conn, "ix_realtime_events_created_at", "realtime_events", "created_at")
+    conn.execute(text("ANALYZE")) # Fresh statistics so the planner actually picks them
+
+def _restaurant_listing_indexes(conn):
+    _create_index(conn, "ix_restaurants_cuisine_open_id", "restaurants", "cuisine_type, is_open, id")
+    _create_index(conn, "ix_restaurants_open_id", "restaurants", "is_open, id")
+    conn.execute(text("ANALYZE restaurants"))
+
+def _order_restaurants(conn):
+    _add_column(conn, "orders", "restaurant_id", "INTEGER REFERENCES restaurants(id)")
+    # Existing cart orders belong to the restaurant of their items
+    conn.execute(text(
+        "UPDATE orders SET restaurant_id = ("
+        " SELECT m.restaurant_id FROM order_lines l JOIN menu_items m ON m.id = l.menu_item_id"
+        " WHERE l.order_id = orders.id LIMIT 1"
+        ") WHERE restaurant_id IS NULL"
+    ))
+    _create_index(conn, "ix_orders_restaurant_id_status_id", "orders", "restaurant_id, status, id")
+    conn.execute(text("ANALYZE orders"))
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "backfill columns", _backfill_columns),
+    (3, "hot path indexes", _hot_path_indexes),
+    (4, "restaurants R*Tree", geo.create_spatial_index),
+    (5, "catalogue FTS5", fulltext.create_fulltext_index),
+    (6, "restaurant listing indexes", _restaurant_listing_indexes),
+    (7, "orders belong to restaurants", _order_restaurants),
+]
+
+# --- RUNNER ---
+def create_migration_engine():
+    # Every transaction starts with BEGIN IMMEDIATE: the write lock is taken up front,
+    # so two workers can never both decide that a migration is pending.
+    engine = database.apply_pragmas(create_engine(
+        database.SQLALCHEMY_DATABASE_URL,
+        connect_args={"timeout": MIGRATION_LOCK_TIMEOUT_SECONDS},
+        poolclass=NullPool,
+    ))
+
+    @event.listens_for(engine, "connect")
+    def _manual_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None # We send BEGIN ourselves (DDL included)
+        # After the profile PRAGMAs: their busy_timeout would cut the lock wait short
+        dbapi_connection.execute(f"PRAGMA busy_timeout={MIGRATION_LOCK_TIMEOUT_SECONDS * 1000}")
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+def _ensure_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations "
+        "(version INTEGER PRIMARY KEY, name VARCHAR, applied_at FLOAT)"
+    ))
+
+def applied_versions(conn) -> set:
+    _ensure_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def migrate(engine=None) -> list:
+    """Apply pending migrations in one transaction. Returns the versions applied."""
+    engine = engine or create_migration_engine()
+    applied = []
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+        for version, name, apply in MIGRATIONS:
+            if version in done:
+                continue
+            started = time.perf_counter()
+            apply(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": time.time()},
+            )
+            logger.info("Applied migration %s (%s) in %.0f ms", version, name, (time.perf_counter() - started) * 1000)
+            applied.append(version)
+    engine.dispose()
+    return applied
+
+# --- CHECK MODE ---
+# The queries the request handlers and background tasks run most, in the shape
+# they are sent. Keep in sync when a hot query changes.
+HOT_QUERIES = {
+    "login / principal lookup": "SELECT * FROM users WHERE username = :v",
+    "order by id": "SELECT * FROM orders WHERE id = :v",
+    "order history page": "SELECT * FROM orders WHERE customer_id = :v AND id < :v ORDER BY id DESC LIMIT 20",
+    "order lines": "SELECT * FROM order_lines WHERE order_id IN (:v, :v)",
+    "lifecycle due orders": (
+        "SELECT id FROM orders WHERE status = :v AND next_transition_at <= :v "
+        "ORDER BY next_transition_at LIMIT 1000"
+    ),
+    "lifecycle next due": "SELECT min(next_transition_at) FROM orders",
+    "chat history page": (
+        "SELECT id, sender_type, message, timestamp FROM chat_messages "
+        "WHERE order_id = :v AND id > :v ORDER BY id LIMIT 100"
+    ),
+    "menu feed page": (
+        "SELECT menu_items.id, menu_items.name, coalesce(restaurants.name, 'Unknown') FROM menu_items "
+        "LEFT OUTER JOIN restaurants ON menu_items.restaurant_id = restaurants.id "
+        "WHERE menu_items.id > :v ORDER BY menu_items.id LIMIT 100"
+    ),
+    "menu feed of one restaurant": (
+        "SELECT menu_items.id FROM menu_items "
+        "WHERE menu_items.id > :v AND menu_items.restaurant_id = :v ORDER BY menu_items.id LIMIT 100"
+    ),
+    "restaurant list by cuisine": (
+        "SELECT id, name, rating FROM restaurants WHERE cuisine_type = :v AND is_open = :v "
+        "AND rating >= :v AND id > :v ORDER BY id LIMIT 20"
+    ),
+    "open restaurants list": (
+        "SELECT id, name, rating FROM restaurants WHERE is_open = :v AND id > :v ORDER BY id LIMIT 20"
+    ),
+    "menus of a restaurant page": (
+        "SELECT id, name, description, price, restaurant_id FROM menu_items "
+        "WHERE restaurant_id IN (:v, :v, :v) ORDER BY restaurant_id, id"
+    ),
+    "kitchen queue page": (
+        "SELECT * FROM orders WHERE restaurant_id = :v AND status IN ('pending', 'cooking') "
+        "AND id > :v ORDER BY id LIMIT 50"
+    ),
+    "home feed cuisine history": (
+        "SELECT restaurant_id FROM orders WHERE customer_id = :v AND restaurant_id IS NOT NULL "
+        "ORDER BY id DESC LIMIT 50"
+    ),
+    "cart item validation": "SELECT id, name, price, restaurant_id FROM menu_items WHERE id IN (:v, :v, :v)",
+    "restaurants of an owner": "SELECT id FROM restaurants WHERE owner_id = :v",
+    "backplane tail": (
+        "SELECT id, channel, room_id, payload, origin FROM realtime_events "
+        "WHERE id > :v ORDER BY id LIMIT 500"
+    ),
+}
+
+def explain(conn, sql: str) -> list:
+    return [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), {"v": 1})]
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN t" walks the whole table; "SEARCH ... USING INDEX" and virtual tables are fine
+    return detail.startswith("SCAN ") and "VIRTUAL TABLE" not in detail and "USING" not in detail
+
+def lock_timeout_ms(engine) -> int:
+    """Effective busy_timeout of a connection from `engine`."""
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+
+def check(engine=None) -> int:
+    """
+    Print the plan of every hot query. Returns how many do a full table scan (or
+    fail), plus one if migrations would not wait MIGRATION_LOCK_TIMEOUT_SECONDS for the lock.
+    """
+    engine = engine or database.engine
+    scans = 0
+    waited = lock_timeout_ms(create_migration_engine())
+    if waited != MIGRATION_LOCK_TIMEOUT_SECONDS * 1000:
+        scans += 1
+        print(f"{'ERROR':<10} migration lock wait is {waited}ms, expected {MIGRATION_LOCK_TIMEOUT_SECONDS * 1000}ms")
+    with engine.connect() as conn:
+        for name, sql in HOT_QUERIES.items():
+            try:
+                plan = explain(conn, sql)
+            except OperationalError as e: # e.g. table not created yet: run the migrations first
+                scans += 1
+                print(f"{'ERROR':<10} {name}\n           {e.orig}")
+                continue
+            full = [d for d in plan if is_full_scan(d)]
+            sort = [d for d in plan if d.startswith("USE TEMP B-TREE")]
+            scans += bool(full)
+            verdict = "FULL SCAN" if full else ("sort" if sort else "ok")
+            print(f"{verdict:<10} {name}")
+            for detail in plan:
+                print(f"           {detail}")
+    return scans
+
+def status(engine=None):
+    engine = engine or create_migration_engine()
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    for version, name, _ in MIGRATIONS:
+        print(f"{'applied' if version in done else 'pending':<8} {version:>3}  {name}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="UrbanPlate schema migrations")
+    parser.add_argument("--check", action="store_true", help="report full table scans in the hot queries")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    args = parser.parse_args()
+    if args.status:
+        status()
+    elif args.check:
+        sys.exit(1 if check() else 0)
+    else:
+        print(f"Applied: {migrate() or 'nothing, schema is up to date'}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -20,6 +20,11 @@ class UserDB(Base):
 # --- BUSINESS TABLES ---
 class RestaurantDB(Base):
     __tablename__ = "restaurants"
+    # GET /restaurants filters, walked in id order for keyset pages
+    __table_args__ = (
+        Index("ix_restaurants_cuisine_open_id", "cuisine_type", "is_open", "id"),
+        Index("ix_restaurants_open_id", "is_open", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     cuisine_type = Column(String) 
@@ -29,7 +34,7 @@ class RestaurantDB(Base):
     longitude = Column(Float)
     
     # Link to Owner
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
     owner = relationship("UserDB", back_populates="restaurants")
     
     # Link to Menu
@@ -43,22 +48,49 @@ class MenuItemDB(Base):
     price = Column(Float)             
     
     # Link to Restaurant
-    restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), index=True)
     restaurant = relationship("RestaurantDB", back_populates="menu_items")
 
 class OrderDB(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Order history: WHERE customer_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_orders_customer_id_id", "customer_id", "id"),
+        # Kitchen queue: WHERE restaurant_id = ? AND status = ? AND id > ? ORDER BY id
+        Index("ix_orders_restaurant_id_status_id", "restaurant_id", "status", "id"),
+    )
+    
     id = Column(Integer, primary_key=True, index=True)
-    item_name = Column(String)
-    quantity = Column(Integer)
+    item_name = Column(String) # Cart orders: summary of the lines, e.g. "Burger x2, Fries"
+    quantity = Column(Integer) # Cart orders: total units
     customer_id = Column(Integer)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True) # NULL for legacy orders placed without one
     status = Column(String, default="pending") 
+    total_price = Column(Float, nullable=True) # NULL for legacy free-text orders
+    # Persisted lifecycle timer (epoch seconds, NULL = no automatic transition)
+    next_transition_at = Column(Float, nullable=True, index=True)
     
     # Link to Chat
     chat_messages = relationship("ChatMessageDB", back_populates="order", cascade="all, delete")
+    # Cart lines
+    lines = relationship("OrderLineDB", back_populates="order", cascade="all, delete-orphan")
+
+class OrderLineDB(Base):
+    __tablename__ = "order_lines"
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    menu_item_id = Column(Integer, ForeignKey("menu_items.id"))
+    quantity = Column(Integer)
+    # Snapshot at order time, so menu edits don't rewrite past orders
+    item_name = Column(String)
+    unit_price = Column(Float)
+    
+    order = relationship("OrderDB", back_populates="lines")
 
 class ChatMessageDB(Base):
     __tablename__ = "chat_messages"
+    # History pages & reconnect replay: WHERE order_id = ? AND id > ? ORDER BY id
+    __table_args__ = (Index("ix_chat_messages_order_id_id", "order_id", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
@@ -75,4 +107,15 @@ class UserLocationDB(Base):
     address_label = Column(String)
     address_text = Column(String)
     latitude = Column(Float)
-    longitude = Column(Float)
\ No newline at end of file
+    longitude = Column(Float)
+
+# --- INFRA TABLES ---
+# Cross-worker realtime notification log (see apps/backplane.py)
+class RealtimeEventDB(Base):
+    __tablename__ = "realtime_events"
+    id = Column(Integer, primary_key=True)
+    channel = Column(String)   # "chat", "order_status", ...
+    room_id = Column(Integer)  # e.g. the order id
+    payload = Column(String)   # already-serialized JSON frame
+    origin = Column(String)    # publishing worker, so it can skip its own events
+    created_at = Column(Float, index=True)
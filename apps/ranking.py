@@ -0,0 +1,187 @@
+import asyncio
+import math
+import os
+from typing import Optional
+import numpy as np
+from sqlalchemy import select
+from . import backplane, database, geo, models
+
+# Home feed ranking. Every open restaurant is scored for the caller in one pass
+# over flat NumPy arrays (coordinates, rating, cuisine code, open flag). No ORM
+# objects and no per-row Python. The arrays are loaded once, then only the
+# restaurants that changed are re-read. Other workers hear about changes on the
+# "ranking" backplane channel.
+FEED_SPEED_KMH = float(os.getenv("URBANPLATE_FEED_SPEED_KMH", "20")) # Courier average, door to door
+FEED_PREP_MINUTES = float(os.getenv("URBANPLATE_FEED_PREP_MINUTES", "15"))
+FEED_WEIGHT_ETA = float(os.getenv("URBANPLATE_FEED_WEIGHT_ETA", "0.5"))
+FEED_WEIGHT_RATING = float(os.getenv("URBANPLATE_FEED_WEIGHT_RATING", "0.3"))
+FEED_WEIGHT_CUISINE = float(os.getenv("URBANPLATE_FEED_WEIGHT_CUISINE", "0.2"))
+MAX_RATING = 5.0
+
+COLUMNS = (
+    models.RestaurantDB.id, models.RestaurantDB.name, models.RestaurantDB.cuisine_type,
+    models.RestaurantDB.rating, models.RestaurantDB.is_open,
+    models.RestaurantDB.latitude, models.RestaurantDB.longitude,
+)
+
+def eta_minutes(distance_km):
+    return FEED_PREP_MINUTES + distance_km / FEED_SPEED_KMH * 60
+
+class RankingSnapshot:
+    """
+    One slot per restaurant in parallel arrays; `active` is open AND located.
+    Deleted restaurants free their slot for the next new one.
+    """
+
+    def __init__(self, capacity: int = 1024, bus=None):
+        self.slots: dict[int, int] = {} # restaurant id -> slot
+        self.rows: list = [] # slot -> (id, name, cuisine_type, rating, latitude, longitude), for the response
+        self.cuisines: dict[str, int] = {} # cuisine_type -> code
+        self._free: list = []
+        self._allocate(capacity)
+        self.loaded = False
+        self._dirty: set = set()
+        self._lock = asyncio.Lock()
+        self.backplane = bus or backplane.bus
+        self.backplane.subscribe("ranking", self._invalidate_remote)
+
+    def _allocate(self, capacity: int):
+        self.lat = np.zeros(capacity) # Radians
+        self.lng = np.zeros(capacity)
+        self.cos_lat = np.zeros(capacity)
+        self.rating = np.zeros(capacity)
+        self.cuisine = np.zeros(capacity, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.rows = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1)) # pop() hands out low slots first
+
+    def _grow(self):
+        old = len(self.rows)
+        arrays = ("lat", "lng", "cos_lat", "rating", "cuisine", "active")
+        for name in arrays:
+            current = getattr(self, name)
+            grown = np.zeros(old * 2, dtype=current.dtype)
+            grown[:old] = current
+            setattr(self, name, grown)
+        self.rows += [None] * old
+        self._free = list(range(old * 2 - 1, old - 1, -1))
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    # --- UPDATES ---
+    def load(self, rows: list):
+        """Replace everything with these rows (column order as COLUMNS)."""
+        self._allocate(max(1024, len(rows) * 5 // 4)) # Headroom for new restaurants
+        self.slots = {}
+        for row in rows:
+            self.upsert(row)
+        self.loaded = True
+
+    def upsert(self, row):
+        """Store one (id, name, cuisine_type, rating, is_open, latitude, longitude) row."""
+        restaurant_id, name, cuisine_type, rating, is_open, latitude, longitude = row
+        slot = self.slots.get(restaurant_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self.slots[restaurant_id] = self._free.pop()
+        located = latitude is not None and longitude is not None
+        self.rows[slot] = (restaurant_id, name, cuisine_type, rating or 0.0, latitude, longitude)
+        lat = math.radians(latitude) if located else 0.0
+        self.lat[slot] = lat
+        self.lng[slot] = math.radians(longitude) if located else 0.0
+        self.cos_lat[slot] = math.cos(lat)
+        self.rating[slot] = rating or 0.0
+        self.cuisine[slot] = self.cuisines.setdefault(cuisine_type, len(self.cuisines))
+        self.active[slot] = bool(is_open) and located
+
+    def remove(self, restaurant_id: int):
+        slot = self.slots.pop(restaurant_id, None)
+        if slot is not None:
+            self.active[slot] = False
+            self.rows[slot] = None
+            self._free.append(slot)
+
+    async def invalidate(self, restaurant_id: int):
+        """Call after committing a restaurant create/update/delete."""
+        self._dirty.add(restaurant_id)
+        await self.backplane.publish("ranking", restaurant_id, "")
+
+    def _invalidate_remote(self, room_id: int, payload: str):
+        self._dirty.add(room_id)
+
+    async def sync(self):
+        """Full load on first use, then re-read only the restaurants marked dirty (one query)."""
+        if self.loaded and not self._dirty:
+            return
+        async with self._lock:
+            if self.loaded and not self._dirty:
+                return # Done by the request we waited for
+            async with database.ReadSessionLocal() as db:
+                if not self.loaded:
+                    self._dirty.clear() # The full load sees every committed change
+                    self.load((await db.execute(select(*COLUMNS))).all())
+                    return
+                dirty, self._dirty = self._dirty, set()
+                try:
+                    rows = (await db.execute(select(*COLUMNS).filter(models.RestaurantDB.id.in_(dirty)))).all()
+                except Exception:
+                    self._dirty |= dirty
+                    raise
+            for row in rows:
+                self.upsert(row)
+            for restaurant_id in dirty - {row.id for row in rows}:
+                self.remove(restaurant_id) # Deleted
+
+    # --- RANKING ---
+    def rank(self, latitude: float, longitude: float, radius_km: float, limit: int,
+             cuisine_affinity: Optional[dict] = None, cuisines: Optional[list] = None) -> list:
+        """
+        Top `limit` open restaurants within `radius_km`, best first, as
+        (row, distance_km, eta_minutes, score). cuisine_affinity maps a cuisine to
+        0..1 (how much this customer likes it); `cuisines` restricts the feed.
+        """
+        # Cheap bounding-box mask first, the haversine only runs on what is left
+        min_lat, max_lat, min_lng, max_lng = (np.radians(v) for v in geo.bounding_box(latitude, longitude, radius_km))
+        mask = self.active & (self.lat >= min_lat) & (self.lat <= max_lat)
+        if max_lng - min_lng < 2 * np.pi:
+            mask &= (self.lng >= min_lng) & (self.lng <= max_lng)
+        if cuisines is not None:
+            codes = [self.cuisines[c] for c in cuisines if c in self.cuisines]
+            mask &= np.isin(self.cuisine, codes)
+        candidates = np.flatnonzero(mask)
+
+        lat0, lng0 = np.radians(latitude), np.radians(longitude)
+        a = (np.sin((self.lat[candidates] - lat0) / 2) ** 2
+             + np.cos(lat0) * self.cos_lat[candidates] * np.sin((self.lng[candidates] - lng0) / 2) ** 2)
+        distance = 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        inside = distance <= radius_km
+        candidates, distance = candidates[inside], distance[inside]
+        if not len(candidates):
+            return []
+
+        eta = eta_minutes(distance)
+        score = (
+            FEED_WEIGHT_ETA * (1 - (eta - FEED_PREP_MINUTES) / (eta_minutes(radius_km) - FEED_PREP_MINUTES))
+            + FEED_WEIGHT_RATING * np.clip(self.rating[candidates] / MAX_RATING, 0, 1)
+        )
+        if cuisine_affinity:
+            affinity = np.zeros(len(self.cuisines))
+            for cuisine_type, weight in cuisine_affinity.items():
+                if cuisine_type in self.cuisines:
+                    affinity[self.cuisines[cuisine_type]] = weight
+            score += FEED_WEIGHT_CUISINE * affinity[self.cuisine[candidates]]
+
+        # Partial sort: only the winners get ordered (ties: nearest first)
+        if len(score) > limit:
+            top = np.argpartition(-score, limit - 1)[:limit]
+        else:
+            top = np.arange(len(score))
+        top = top[np.lexsort((distance[top], -score[top]))]
+        return [
+            (self.rows[candidates[i]], float(distance[i]), float(eta[i]), float(score[i]))
+            for i in top
+        ]
+
+snapshot = RankingSnapshot()
@@ -0,0 +1,178 @@
+import os
+import time
+from typing import Optional
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import event
+from . import models, auth, chat_writer, metrics
+
+# Every write funnels into one SQLite writer, so one noisy client can slow down
+# everybody's checkout. Two layers in front of the write endpoints:
+#   1. token buckets per (route, user) and per order for chat WebSocket messages -> 429
+#   2. global load shedding when the write queue or DB latency is past a limit -> 503
+RATE_LIMITS_ENABLED = os.getenv("URBANPLATE_RATE_LIMITS", "on") != "off"
+MAX_TRACKED_KEYS = int(os.getenv("URBANPLATE_RATE_LIMIT_KEYS", "100000")) # Per route
+
+def _limit(route: str, default: str) -> tuple:
+    # "<tokens per second>/<burst>", e.g. URBANPLATE_RATE_ORDERS_PLACE=1/10
+    rate, burst = os.getenv("URBANPLATE_RATE_" + route.upper().replace(".", "_"), default).split("/")
+    return float(rate), float(burst)
+
+ROUTE_LIMITS = {
+    "orders.place": _limit("orders.place", "1/10"),
+    "orders.status": _limit("orders.status", "2/20"),
+    "chat.send": _limit("chat.send", "5/20"),
+    "chat.edit": _limit("chat.edit", "2/10"),
+    "catalog.edit": _limit("catalog.edit", "5/50"), # Restaurant & menu edits: owners bulk-edit menus
+    "chat.ws": _limit("chat.ws", "5/20"), # Per order (all sockets of the room), not per user
+}
+
+SHED_MAX_WRITE_QUEUE = int(os.getenv("URBANPLATE_SHED_MAX_WRITE_QUEUE", "200")) # 0 disables
+SHED_DB_LATENCY_MS = float(os.getenv("URBANPLATE_SHED_DB_LATENCY_MS", "1000")) # 0 disables
+DB_LATENCY_ALPHA = 0.2
+DB_LATENCY_HALF_LIFE_SECONDS = 2.0 # With no writes going through, the estimate decays back to zero
+
+# --- TOKEN BUCKETS ---
+class TokenBuckets:
+    """
+    One limit, many keys: key -> (tokens, timestamp), nothing else. A missing key
+    is a full bucket, so idle keys are simply dropped when the table fills up.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_TRACKED_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: dict = {}
+
+    def take(self, key, now: Optional[float] = None) -> float:
+        """Take one token. Returns 0.0 if allowed, else the seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        state = self.buckets.pop(key, None) # Re-inserted below: dict order = least recently used first
+        tokens = self.burst if state is None else min(self.burst, state[0] + (now - state[1]) * self.rate)
+        if len(self.buckets) >= self.max_keys:
+            self._prune(now)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self.buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def _prune(self, now: float):
+        # Drop buckets that have refilled by now; if that is not enough, the least recently used half
+        refill = self.burst / self.rate
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < refill}
+        if len(self.buckets) >= self.max_keys:
+            keys = list(self.buckets)
+            for key in keys[:len(keys) // 2]:
+                del self.buckets[key]
+
+buckets = {route: TokenBuckets(rate, burst) for route, (rate, burst) in ROUTE_LIMITS.items()}
+
+# --- LOAD SHEDDING ---
+class LoadShedder:
+    def __init__(self, max_write_queue: int = SHED_MAX_WRITE_QUEUE, max_db_latency_ms: float = SHED_DB_LATENCY_MS):
+        self.max_write_queue = max_write_queue
+        self.max_db_latency = max_db_latency_ms / 1000
+        self.inflight = 0 # Admitted write requests still running
+        self._latency = 0.0 # EWMA of write statement time, seconds
+        self._latency_at = time.monotonic()
+
+    def write_queue_depth(self) -> int:
+        return self.inflight + chat_writer.writer.depth
+
+    def db_latency(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return self._latency * 0.5 ** ((now - self._latency_at) / DB_LATENCY_HALF_LIFE_SECONDS)
+
+    def observe(self, seconds: float):
+        now = time.monotonic()
+        current = self.db_latency(now)
+        self._latency = current + DB_LATENCY_ALPHA * (seconds - current)
+        self._latency_at = now
+
+    def overloaded(self) -> Optional[str]:
+        """The reason to refuse a write right now, or None."""
+        if self.max_write_queue and self.write_queue_depth() >= self.max_write_queue:
+            return "write_queue"
+        if self.max_db_latency and self.db_latency() >= self.max_db_latency:
+            return "db_latency"
+        return None
+
+    def watch_engine(self, engine):
+        """Feed the latency estimate from every statement run on a write engine."""
+        sync_engine = getattr(engine, "sync_engine", engine)
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("urbanplate_shed_start", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            self.observe(time.perf_counter() - conn.info["urbanplate_shed_start"].pop())
+
+shedder = LoadShedder()
+
+# --- METRICS ---
+rejected = metrics.registry.add(metrics.Counter(
+    "urbanplate_ratelimit_rejected_total", "Requests and WebSocket messages refused by a rate limit.", ("route",)))
+shed = metrics.registry.add(metrics.Counter(
+    "urbanplate_load_shed_total", "Writes refused while overloaded.", ("route", "reason")))
+metrics.registry.add(metrics.Gauge(
+    "urbanplate_ratelimit_keys", "Token buckets held in memory.", ("route",),
+    lambda: [((route,), len(b.buckets)) for route, b in buckets.items()]))
+metrics.registry.add(metrics.Gauge(
+    "urbanplate_write_queue_depth", "Write requests in flight plus queued chat messages.", (),
+    lambda: [((), shedder.write_queue_depth())]))
+metrics.registry.add(metrics.Gauge(
+    "urbanplate_write_db_latency_seconds", "Smoothed latency of write statements.", (),
+    lambda: [((), shedder.db_latency())]))
+
+# --- ADMISSION ---
+def _retry_after(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, int(seconds + 0.999)))}
+
+def admit(route: str, key) -> None:
+    """Raise 503 if the server is shedding writes, 429 if `key` is out of tokens for `route`."""
+    reason = shedder.overloaded()
+    if reason:
+        shed.inc(route, reason)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers=_retry_after(1),
+        )
+    if not RATE_LIMITS_ENABLED:
+        return
+    wait = buckets[route].take(key)
+    if wait:
+        rejected.inc(route)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, slow down",
+            headers=_retry_after(wait),
+        )
+
+def limit(route: str):
+    """
+    Dependency for a write endpoint: per-user bucket + shedding, and counts the
+    request as in flight until it finishes.
+
+        @router.post("/place", dependencies=[Depends(ratelimit.limit("orders.place"))])
+    """
+    async def dependency(current_user: models.UserDB = Depends(auth.get_current_user)):
+        admit(route, current_user.id)
+        shedder.inflight += 1
+        try:
+            yield
+        finally:
+            shedder.inflight -= 1
+    return dependency
+
+def admit_ws_message(order_id: int) -> Optional[dict]:
+    """None if a chat WebSocket message may be written, else the frame to send back instead."""
+    try:
+        admit("chat.ws", order_id)
+    except HTTPException as e:
+        event_name = "rate_limited" if e.status_code == status.HTTP_429_TOO_MANY_REQUESTS else "busy"
+        return {"event": event_name, "retry_after": int(e.headers["Retry-After"])}
+    return None
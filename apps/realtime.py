@@ -0,0 +1,265 @@
+import asyncio
+import contextlib
+import json
+import os
+from typing import List, Optional
+from fastapi import WebSocket, WebSocketDisconnect, status
+from . import backplane, framing
+
+# Per-room WebSocket registry shared by chat and order status streams.
+# Each socket gets its own bounded outbound queue + sender task, so one slow
+# phone can't hold up the rest of the room. Overflow or a send error evicts it.
+# Sockets pick a wire format when they connect (see apps/framing.py), and with
+# ?batch=1 get the frames of a burst as one array every URBANPLATE_WS_BATCH_MS.
+SEND_QUEUE_SIZE = int(os.getenv("URBANPLATE_CHAT_SEND_QUEUE", "64"))
+WS_BATCH_MS = float(os.getenv("URBANPLATE_WS_BATCH_MS", "25"))
+CLOSE_TIMEOUT_SECONDS = 2.0
+
+async def accept(websocket: WebSocket) -> Optional[str]:
+    """Accept with the best wire format the client offered; None is JSON text."""
+    fmt = framing.negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=fmt)
+    return fmt
+
+async def receive_json(websocket: WebSocket, fmt: Optional[str]):
+    """
+    Next message from a socket that is not in a room (e.g. location pings): JSON
+    in a text frame, or a binary frame in `fmt`. ValueError if it does not decode.
+    """
+    frame = await _receive(websocket)
+    if frame.get("text") is not None:
+        return json.loads(frame["text"])
+    return framing.decode(fmt, frame.get("bytes") or b"")
+
+async def send_json(websocket: WebSocket, fmt: Optional[str], message):
+    await _send(websocket, framing.encode(fmt, message))
+
+async def _receive(websocket: WebSocket) -> dict:
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+    return frame
+
+async def _send(websocket: WebSocket, frame):
+    if isinstance(frame, str):
+        await websocket.send_text(frame)
+    else:
+        await websocket.send_bytes(frame)
+
+class Connection:
+    def __init__(self, websocket: WebSocket, room_id: int, queue_size: int,
+                 fmt: Optional[str] = None, batch: bool = False):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.fmt = fmt # Negotiated subprotocol, None = JSON text
+        self.batch = batch
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size) # (message id or None, frame)
+        self.sender: Optional[asyncio.Task] = None
+        self.replayed_upto = 0 # Live frames with an id <= this were already replayed
+
+class ConnectionManager:
+    def __init__(self, channel: str, queue_size: int = SEND_QUEUE_SIZE, bus=None, batch_ms: float = WS_BATCH_MS):
+        self.channel = channel
+        self.queue_size = queue_size
+        self.batch_window = batch_ms / 1000
+        self._batches: dict[int, list] = {} # room -> [(message, text, message id)] waiting for the batch timer
+        # Pub/sub between workers; frames from other workers land in _deliver_remote()
+        self.backplane = bus or backplane.bus
+        self.backplane.subscribe(channel, self._deliver_remote)
+        self.active_connections: dict[int, List[Connection]] = {}
+        # Metrics
+        self.messages_broadcast = 0
+        self.frames_sent = 0
+        self.dropped_slow = 0
+        self.dropped_dead = 0
+
+    async def connect(self, websocket: WebSocket, room_id: int, paused: bool = False):
+        """
+        Register a socket. With paused=True live frames are queued but not sent
+        until start() is called, which lets the caller send a replay/snapshot first
+        (with send_first()).
+        """
+        batch = self.batch_window > 0 and websocket.query_params.get("batch") in ("1", "true")
+        fmt = await accept(websocket)
+        await self.backplane.start()
+        conn = Connection(websocket, room_id, self.queue_size, fmt, batch)
+        self.active_connections.setdefault(room_id, []).append(conn)
+        if not paused:
+            self.start(conn)
+        return conn
+
+    def start(self, conn: Connection, replayed_upto: int = 0):
+        conn.replayed_upto = replayed_upto
+        conn.sender = asyncio.create_task(self._sender(conn))
+
+    def disconnect(self, websocket: WebSocket, room_id: int):
+        room = self.active_connections.get(room_id, [])
+        for conn in room:
+            if conn.websocket is websocket:
+                self._remove(conn)
+                break
+
+    async def broadcast(self, message: dict, room_id: int):
+        # Serialize once per broadcast (JSON text also goes to the backplane)
+        text = framing.json_text(message)
+        self.messages_broadcast += 1
+        self._deliver(room_id, message, text, message.get("id"))
+        await self.backplane.publish(self.channel, room_id, text)
+
+    async def broadcast_many(self, messages: list):
+        """[(message, room_id)] - one backplane write for the whole batch."""
+        frames = []
+        for message, room_id in messages:
+            text = framing.json_text(message)
+            self._deliver(room_id, message, text, message.get("id"))
+            frames.append((room_id, text))
+        self.messages_broadcast += len(frames)
+        await self.backplane.publish_many(self.channel, frames)
+
+    def send(self, conn: Connection, message: dict):
+        """Queue a frame for one socket only (goes out through its sender, in order)."""
+        try:
+            conn.queue.put_nowait((None, framing.encode(conn.fmt, message)))
+        except asyncio.QueueFull:
+            pass # Already backed up: it is about to be evicted anyway
+
+    async def send_first(self, conn: Connection, message: dict):
+        """Send a frame right away, ahead of the queue. Only before start() (snapshots, replays)."""
+        await _send(conn.websocket, framing.encode(conn.fmt, message))
+
+    async def receive_text(self, conn: Connection) -> str:
+        """
+        Next text from the client: a text frame as is, or a binary frame in the
+        negotiated format holding a string or {"message": ...}. ValueError if it is neither.
+        """
+        frame = await _receive(conn.websocket)
+        if frame.get("text") is not None:
+            return frame["text"]
+        data = framing.decode(conn.fmt, frame.get("bytes") or b"")
+        if isinstance(data, dict):
+            data = data.get("message")
+        if not isinstance(data, str):
+            raise ValueError("expected a string or {\"message\": string}")
+        return data
+
+    @contextlib.asynccontextmanager
+    async def serving(self, conn: Connection):
+        """
+        Wrap a socket's receive loop: the client leaving, or the socket being closed
+        under us (e.g. evicted as a slow consumer), ends it quietly. Unregisters on exit.
+        """
+        try:
+            yield
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self._remove(conn)
+
+    async def serve_push_only(self, conn: Connection):
+        """Push-only sockets: ignore whatever the client sends until it leaves."""
+        async with self.serving(conn):
+            while (await conn.websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+    def _deliver_remote(self, room_id: int, text: str):
+        if room_id in self.active_connections:
+            message = json.loads(text)
+            self._deliver(room_id, message, text, message.get("id") if isinstance(message, dict) else None)
+
+    def _deliver(self, room_id: int, message, text: str, message_id: Optional[int] = None):
+        room = self.active_connections.get(room_id)
+        if not room:
+            return
+        frames = {} # format -> frame: encoded once, shared by the room
+        batched = False
+        for conn in list(room):
+            if conn.batch:
+                batched = True
+                continue
+            frame = frames.get(conn.fmt)
+            if frame is None:
+                frame = frames[conn.fmt] = framing.encode(conn.fmt, message, text)
+            self._enqueue(conn, message_id, frame)
+        if batched:
+            self._add_to_batch(room_id, message, text, message_id)
+
+    def _add_to_batch(self, room_id: int, message, text: str, message_id: Optional[int]):
+        batch = self._batches.get(room_id)
+        if batch is None:
+            batch = self._batches[room_id] = []
+            asyncio.get_running_loop().call_later(self.batch_window, self._flush_batch, room_id)
+        batch.append((message, text, message_id))
+
+    def _flush_batch(self, room_id: int):
+        # One array frame per format for everything broadcast during the window
+        batch = self._batches.pop(room_id, None)
+        room = self.active_connections.get(room_id)
+        if not batch or not room:
+            return
+        messages = [message for message, _, _ in batch]
+        text = "[" + ",".join(text for _, text, _ in batch) + "]"
+        ids = [message_id for _, _, message_id in batch]
+        # Replay skip (see _sender) only when every message in it was replayed
+        batch_id = max(ids) if None not in ids else None
+        frames = {}
+        for conn in list(room):
+            if not conn.batch:
+                continue
+            frame = frames.get(conn.fmt)
+            if frame is None:
+                frame = frames[conn.fmt] = framing.encode(conn.fmt, messages, text)
+            self._enqueue(conn, batch_id, frame)
+
+    def _enqueue(self, conn: Connection, message_id: Optional[int], frame):
+        try:
+            conn.queue.put_nowait((message_id, frame))
+        except asyncio.QueueFull:
+            self.dropped_slow += 1
+            self._evict(conn, code=status.WS_1013_TRY_AGAIN_LATER)
+
+    async def _sender(self, conn: Connection):
+        try:
+            while True:
+                message_id, frame = await conn.queue.get()
+                if message_id is not None and message_id <= conn.replayed_upto:
+                    continue
+                await _send(conn.websocket, frame)
+                self.frames_sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket died without a clean WebSocketDisconnect
+            self.dropped_dead += 1
+            self._remove(conn)
+
+    def _remove(self, conn: Connection):
+        room = self.active_connections.get(conn.room_id)
+        if room and conn in room:
+            room.remove(conn)
+            if not room:
+                del self.active_connections[conn.room_id]
+        if conn.sender and conn.sender is not asyncio.current_task():
+            conn.sender.cancel()
+
+    def _evict(self, conn: Connection, code: int):
+        self._remove(conn)
+        asyncio.create_task(self._close(conn.websocket, code))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), CLOSE_TIMEOUT_SECONDS)
+        except Exception:
+            pass
+
+    def metrics(self) -> dict:
+        depths = [c.queue.qsize() for room in self.active_connections.values() for c in room]
+        return {
+            "rooms": len(self.active_connections),
+            "connections": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "messages_broadcast": self.messages_broadcast,
+            "frames_sent": self.frames_sent,
+            "dropped_slow": self.dropped_slow,
+            "dropped_dead": self.dropped_dead,
+        }
@@ -1,50 +1,47 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, WebSocket, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
 from datetime import datetime
-from jose import jwt, JWTError
-from .. import models, database, schemas, auth
+from .. import models, database, schemas, auth, chat_writer, realtime, ratelimit, serialize
 
 router = APIRouter(prefix="/chat", tags=["Order Chat"])
 
 # --- WEBSOCKET MANAGER ---
-class ChatManager:
-    def __init__(self):
-        self.active_connections: dict[int, List[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, order_id: int):
-        await websocket.accept()
-        if order_id not in self.active_connections:
-            self.active_connections[order_id] = []
-        self.active_connections[order_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, order_id: int):
-        if order_id in self.active_connections:
-            if websocket in self.active_connections[order_id]:
-                self.active_connections[order_id].remove(websocket)
-
-    async def broadcast(self, message: dict, order_id: int):
-        if order_id in self.active_connections:
-            for connection in self.active_connections[order_id]:
-                await connection.send_json(message)
+# Rooms are orders; queues, eviction and the backplane live in apps/realtime.py
+CHAT_HISTORY_PAGE_SIZE = 100
+CHAT_HISTORY_MAX_PAGE_SIZE = 500
+CHAT_REPLAY_LIMIT = 500 # Missed messages replayed on reconnect, the rest via /history
+# Who may post as what: the customer writes as "user", the restaurant owner as "restaurant"
+SENDER_TYPES = {"customer": "user", "restaurant": "restaurant"}
+
+class ChatManager(realtime.ConnectionManager):
+    def __init__(self, **kwargs):
+        super().__init__("chat", **kwargs)
 
 manager = ChatManager()
 
 # --- SECURITY HELPER FOR WEBSOCKETS ---
-async def get_user_from_socket(token: str, db: Session):
+async def get_user_from_socket(token: str, db: AsyncSession):
     """
-    Manually decode JWT for WebSockets since they can't use the Header dependency
+    Manually resolve the JWT for WebSockets since they can't use the Header dependency
+    (goes through the same principal cache as auth.get_current_user)
     """
-    try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-    except JWTError:
-        return None
-        
-    user = db.query(models.UserDB).filter(models.UserDB.username == username).first()
-    return user
+    return await auth.resolve_principal(token, db)
+
+def _messages_after(order_id: int, after_id: int, limit: int):
+    return (
+        select(
+            models.ChatMessageDB.id,
+            models.ChatMessageDB.sender_type,
+            models.ChatMessageDB.message,
+            models.ChatMessageDB.timestamp,
+        )
+        .filter(models.ChatMessageDB.order_id == order_id, models.ChatMessageDB.id > after_id)
+        .order_by(models.ChatMessageDB.id)
+        .limit(limit)
+    )
 
 # --- ENDPOINTS ---
 
@@ -52,66 +49,63 @@ async def get_user_from_socket(token: str, db: Session):
 @router.get("/{order_id}/history", response_model=List[schemas.ChatMessageResponse])
 async def get_chat_history(
     order_id: int, 
-    db: Session = Depends(database.get_db),
+    after_id: int = Query(0, ge=0), # Cursor: id of the last message you already have
+    limit: int = Query(CHAT_HISTORY_PAGE_SIZE, ge=1, le=CHAT_HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(database.get_read_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = await db.get(models.OrderDB, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # AUTH CHECK: Only the Customer (or Admin/Restaurant Owner) can see this
-    # Note: We need to link Orders to Restaurants properly to check Owner ID
-    # For now, we enforce Customer ID check:
-    if order.customer_id != current_user.id:
-        # In a real app, also check: or current_user.id == order.restaurant.owner_id
+    # AUTH CHECK: Only the Customer or the Restaurant Owner can see this
+    if not await auth.order_party(order, current_user, db):
         raise HTTPException(status_code=403, detail="Not authorized to view this chat")
 
     if order.status in ["delivered", "cancelled"]:
         raise HTTPException(status_code=400, detail="Chat is closed")
         
-    return db.query(models.ChatMessageDB).filter(models.ChatMessageDB.order_id == order_id).all()
+    # Served straight from the (order_id, id) index, rows straight to JSON
+    result = await db.execute(_messages_after(order_id, after_id, limit))
+    return serialize.json_response(serialize.rows(result, schemas.ChatMessageResponse))
 
 # 2. SEND MESSAGE (HTTP POST) - SECURE
-@router.post("/{order_id}/{sender_type}/send", response_model=schemas.ChatMessageResponse)
+@router.post("/{order_id}/{sender_type}/send", response_model=schemas.ChatMessageResponse, dependencies=[Depends(ratelimit.limit("chat.send"))])
 async def send_message(
     order_id: int, 
     sender_type: str, 
     chat_data: schemas.ChatMessageCreate, 
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = await db.get(models.OrderDB, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    # AUTH CHECK
-    if order.customer_id != current_user.id:
+    # AUTH CHECK: a party of the order, posting as itself
+    party = await auth.order_party(order, current_user, db)
+    if not party or SENDER_TYPES[party] != sender_type:
         raise HTTPException(status_code=403, detail="Not authorized")
     
     if order.status in ["delivered", "cancelled"]:
         raise HTTPException(status_code=400, detail="Chat is closed")
 
-    # Save
+    # Save (group-committed, returns once the row is durable)
     timestamp = datetime.now().isoformat()
-    new_msg = models.ChatMessageDB(
-        order_id=order_id,
-        sender_type=sender_type,
-        message=chat_data.message,
-        timestamp=timestamp
-    )
-    db.add(new_msg)
-    db.commit()
-    db.refresh(new_msg)
+    message_id = await chat_writer.writer.submit(order_id, sender_type, chat_data.message, timestamp)
+    if message_id is None: # Closed while the line was queued
+        raise HTTPException(status_code=400, detail="Chat is closed")
     
     # Broadcast
     response_data = {
+        "id": message_id,
         "sender_type": sender_type,
         "message": chat_data.message,
         "timestamp": timestamp
     }
     await manager.broadcast(response_data, order_id)
     
-    return new_msg
+    return response_data
 
 # 3. WEBSOCKET - SECURE (Using Query Param for Token)
 @router.websocket("/ws/{order_id}/{sender_type}")
@@ -120,7 +114,8 @@ async def websocket_endpoint(
     order_id: int, 
     sender_type: str, 
     token: str = Query(...), # Expect ?token=... in URL
-    db: Session = Depends(database.get_db)
+    last_seen_id: Optional[int] = Query(None, ge=0), # Reconnect: replay everything after this id
+    db: AsyncSession = Depends(database.get_db)
 ):
     # 1. Manually Validate Token
     user = await get_user_from_socket(token, db)
@@ -129,13 +124,14 @@ async def websocket_endpoint(
         return
 
     # 2. Validate Order & Ownership
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = await db.get(models.OrderDB, order_id)
     if not order:
         await websocket.close(code=1000)
         return
         
-    # AUTH CHECK: Ensure the connected user is the one on the order
-    if order.customer_id != user.id:
+    # AUTH CHECK: the customer or the restaurant owner, posting as itself
+    party = await auth.order_party(order, user, db)
+    if not party or SENDER_TYPES[party] != sender_type:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
@@ -144,50 +140,74 @@ async def websocket_endpoint(
         return
 
     # 3. Connect
-    await manager.connect(websocket, order_id)
+    if last_seen_id is None:
+        await db.close() # Hand the pooled connection back: the socket may stay open for an hour
+        conn = await manager.connect(websocket, order_id)
+    else:
+        # Register first (live frames queue up), replay what was missed, then go live.
+        # Live frames already covered by the replay are skipped by the sender.
+        conn = await manager.connect(websocket, order_id, paused=True)
+        missed = (await db.execute(_messages_after(order_id, last_seen_id, CHAT_REPLAY_LIMIT))).all()
+        await db.close()
+        replayed_upto = last_seen_id
+        for row in missed:
+            await manager.send_first(conn, dict(row._mapping))
+            replayed_upto = row.id
+        if len(missed) == CHAT_REPLAY_LIMIT:
+            await manager.send_first(conn, {"event": "replay_truncated", "next_after_id": replayed_upto})
+        manager.start(conn, replayed_upto)
     
-    try:
+    async with manager.serving(conn):
         while True:
-            data = await websocket.receive_text()
-            
+            try:
+                data = await manager.receive_text(conn) # Text frame, or binary in the negotiated format
+            except ValueError:
+                manager.send(conn, {"event": "invalid"})
+                continue
+
+            # Per-order budget (and global shedding): over it, the message is dropped, not written
+            refusal = ratelimit.admit_ws_message(order_id)
+            if refusal:
+                manager.send(conn, refusal)
+                continue
+
             timestamp = datetime.now().isoformat()
-            new_msg = models.ChatMessageDB(
-                order_id=order_id,
-                sender_type=sender_type,
-                message=data,
-                timestamp=timestamp
-            )
-            db.add(new_msg)
-            db.commit()
+            message_id = await chat_writer.writer.submit(order_id, sender_type, data, timestamp)
+            if message_id is None: # Order delivered or cancelled: chat is closed
+                manager.send(conn, {"event": "chat_closed"})
+                continue
             
             response_data = {
+                "id": message_id,
                 "sender_type": sender_type,
                 "message": data,
                 "timestamp": timestamp
             }
             await manager.broadcast(response_data, order_id)
-            
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, order_id)
 
 # 4. EDIT MESSAGE (SECURE)
-@router.patch("/message/{message_id}")
+@router.patch("/message/{message_id}", dependencies=[Depends(ratelimit.limit("chat.edit"))])
 async def edit_message(
     message_id: int, 
     update_data: schemas.ChatMessageUpdate,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
-    msg = db.query(models.ChatMessageDB).filter(models.ChatMessageDB.id == message_id).first()
+    msg = await db.scalar(
+        select(models.ChatMessageDB)
+        .options(joinedload(models.ChatMessageDB.order))
+        .filter(models.ChatMessageDB.id == message_id)
+    )
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
         
-    # Ensure user owns the order related to this message
-    if msg.order.customer_id != current_user.id:
+    # Only the side that wrote it (customer or restaurant) may edit it
+    party = await auth.order_party(msg.order, current_user, db)
+    if not party or SENDER_TYPES[party] != msg.sender_type:
         raise HTTPException(status_code=403, detail="Not authorized")
 
     msg.message = update_data.message
-    db.commit()
+    await db.commit()
     
     socket_payload = {
         "event": "edit",
@@ -199,23 +219,35 @@ async def edit_message(
     return {"status": "updated", "message": msg.message}
 
 # 5. DELETE MESSAGE (SECURE)
-@router.delete("/message/{message_id}")
+@router.delete("/message/{message_id}", dependencies=[Depends(ratelimit.limit("chat.edit"))])
 async def delete_message(
     message_id: int, 
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
-    msg = db.query(models.ChatMessageDB).filter(models.ChatMessageDB.id == message_id).first()
+    msg = await db.scalar(
+        select(models.ChatMessageDB)
+        .options(joinedload(models.ChatMessageDB.order))
+        .filter(models.ChatMessageDB.id == message_id)
+    )
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
         
-    if msg.order.customer_id != current_user.id:
+    party = await auth.order_party(msg.order, current_user, db)
+    if not party or SENDER_TYPES[party] != msg.sender_type:
         raise HTTPException(status_code=403, detail="Not authorized")
     
     order_id = msg.order_id
-    db.delete(msg)
-    db.commit()
+    await db.delete(msg)
+    await db.commit()
     
     socket_payload = {"event": "delete", "message_id": message_id}
     await manager.broadcast(socket_payload, order_id)
-    return {"status": "deleted"}
\ No newline at end of file
+    return {"status": "deleted"}
+
+# 6. CHAT METRICS (Admin only)
+@router.get("/metrics")
+async def get_chat_metrics(current_user: models.UserDB = Depends(auth.get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return manager.metrics()
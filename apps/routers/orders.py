@@ -1,24 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas, database, auth
-import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, status as ws_status
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
+from .. import models, schemas, database, auth, lifecycle, realtime, ratelimit, serialize, locations
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
-# Simulation Logic
-async def simulate_cooking(order_id: int):
-    await asyncio.sleep(5)
-    print(f"Order {order_id}: Cooking finished (Simulation)")
+MAX_CART_LINES = 50
+ORDER_HISTORY_PAGE_SIZE = 20
+ORDER_HISTORY_MAX_PAGE_SIZE = 100
+KITCHEN_QUEUE_PAGE_SIZE = 50
+KITCHEN_QUEUE_MAX_PAGE_SIZE = 200
+KITCHEN_ACTIVE_STATUSES = ("pending", "cooking")
+
+ORDER_FIELDS = serialize.fields(schemas.OrderResponse, "lines")
+
+def _order_record(order: models.OrderDB) -> dict:
+    record = serialize.record(order, ORDER_FIELDS)
+    record["lines"] = serialize.records(order.lines, schemas.OrderLineResponse)
+    return record
+
+# --- STATUS STREAM ---
+# Rooms are orders. Clients get a snapshot on connect, then one frame per transition
+# instead of polling GET /orders/{id}.
+status_manager = realtime.ConnectionManager("order_status")
+
+def _status_frame(order_id: int, status: str) -> dict:
+    return {"event": "status", "order_id": order_id, "status": status}
+
+# --- KITCHEN FEED ---
+# Rooms are restaurants. Owners get every new order as it is placed and every
+# status change of their orders, so a kitchen screen never polls the orders table.
+kitchen_manager = realtime.ConnectionManager("kitchen")
+
+async def _publish_lifecycle_changes(changed: list):
+    # One frame per advanced order (per audience), one backplane write per pass each
+    await status_manager.broadcast_many([
+        (_status_frame(order_id, new_status), order_id) for order_id, _, _, new_status in changed
+    ])
+    await kitchen_manager.broadcast_many([
+        (_status_frame(order_id, new_status), restaurant_id)
+        for order_id, _, restaurant_id, new_status in changed if restaurant_id is not None
+    ])
+
+lifecycle.engine.listeners.append(_publish_lifecycle_changes)
+
+async def _require_owner(restaurant_id: int, user: models.UserDB, db: AsyncSession):
+    owner_id = await db.scalar(select(models.RestaurantDB.owner_id).filter(models.RestaurantDB.id == restaurant_id))
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    if owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to see this kitchen")
 
 # Endpoints
 
 # 1. PLACE ORDER (SECURE)
-@router.post("/place", response_model=schemas.OrderResponse)
+@router.post("/place", response_model=schemas.OrderResponse, dependencies=[Depends(ratelimit.limit("orders.place"))])
 async def place_order(
     order: schemas.OrderCreate, 
-    background_tasks: BackgroundTasks, 
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user) # REQUIRE LOGIN
 ):
     # SECURITY FIX:
@@ -27,58 +71,242 @@ async def place_order(
     real_customer_id = current_user.id
     
     new_order = models.OrderDB(
-        item_name=order.item_name,
-        quantity=order.quantity,
         customer_id=real_customer_id, # Locked to the token owner
-        status="pending"
+        status="pending",
+        # Kitchen workflow is driven by the lifecycle engine (apps/lifecycle.py)
+        next_transition_at=lifecycle.next_transition_at("pending")
     )
+    if order.items:
+        new_order.lines, new_order.restaurant_id = await _build_lines(order.items, db)
+        new_order.item_name = ", ".join(
+            line.item_name if line.quantity == 1 else f"{line.item_name} x{line.quantity}"
+            for line in new_order.lines
+        )
+        new_order.quantity = sum(line.quantity for line in new_order.lines)
+        new_order.total_price = round(sum(line.unit_price * line.quantity for line in new_order.lines), 2)
+    else:
+        # Legacy single free-text item
+        if not order.item_name or not order.quantity or order.quantity < 1:
+            raise HTTPException(status_code=400, detail="Send 'items', or 'item_name' with a positive 'quantity'")
+        new_order.item_name = order.item_name
+        new_order.quantity = order.quantity
+        new_order.lines = []
+        if order.restaurant_id is not None:
+            if await db.get(models.RestaurantDB, order.restaurant_id) is None:
+                raise HTTPException(status_code=404, detail="Restaurant not found")
+            new_order.restaurant_id = order.restaurant_id
+
+    # Order + all of its lines in one transaction
     db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
+    await db.commit()
     
-    background_tasks.add_task(simulate_cooking, new_order.id)
+    lifecycle.engine.wake()
+    if new_order.restaurant_id is not None:
+        await kitchen_manager.broadcast({"event": "new_order", "order": _order_record(new_order)}, new_order.restaurant_id)
     return new_order
 
-# 2. GET ORDER (SECURE)
+async def _build_lines(items: List[schemas.OrderLineCreate], db: AsyncSession) -> tuple:
+    # Merge repeated items, then validate every id and snapshot prices in one query.
+    # Returns (lines, restaurant_id): one order, one kitchen.
+    quantities = {}
+    for item in items:
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+        quantities[item.menu_item_id] = quantities.get(item.menu_item_id, 0) + item.quantity
+    if len(quantities) > MAX_CART_LINES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CART_LINES} different items per order")
+
+    menu = {
+        row.id: row for row in (await db.execute(
+            select(models.MenuItemDB.id, models.MenuItemDB.name, models.MenuItemDB.price, models.MenuItemDB.restaurant_id)
+            .filter(models.MenuItemDB.id.in_(quantities))
+        )).all()
+    }
+    missing = [item_id for item_id in quantities if item_id not in menu]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Menu items not found: {missing}")
+    restaurants = {row.restaurant_id for row in menu.values()}
+    if len(restaurants) > 1:
+        raise HTTPException(status_code=400, detail="All items of an order must come from the same restaurant")
+
+    lines = [
+        models.OrderLineDB(
+            menu_item_id=item_id,
+            quantity=quantity,
+            item_name=menu[item_id].name,
+            unit_price=menu[item_id].price,
+        )
+        for item_id, quantity in quantities.items()
+    ]
+    return lines, restaurants.pop()
+
+# 2. ORDER HISTORY (SECURE) - newest first
+# Declared before /{order_id} so "history" is not parsed as an id
+@router.get("/history", response_model=List[schemas.OrderResponse])
+async def get_order_history(
+    before_id: Optional[int] = Query(None, ge=1), # Cursor: id of the oldest order you already have
+    limit: int = Query(ORDER_HISTORY_PAGE_SIZE, ge=1, le=ORDER_HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(database.get_read_db),
+    current_user: models.UserDB = Depends(auth.get_current_user)
+):
+    # Served from the (customer_id, id) index; lines come in one extra IN query
+    stmt = (
+        select(models.OrderDB)
+        .options(selectinload(models.OrderDB.lines))
+        .filter(models.OrderDB.customer_id == current_user.id)
+        .order_by(models.OrderDB.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        stmt = stmt.filter(models.OrderDB.id < before_id)
+    return serialize.json_response([_order_record(order) for order in await db.scalars(stmt)])
+
+# 3. GET ORDER (SECURE)
 @router.get("/{order_id}", response_model=schemas.OrderResponse)
 async def get_order(
     order_id: int, 
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_read_db),
     current_user: models.UserDB = Depends(auth.get_current_user) # REQUIRE LOGIN
 ):
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = await db.get(models.OrderDB, order_id, options=[selectinload(models.OrderDB.lines)])
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # AUTH CHECK: Ensure the logged-in user actually owns this order
-    # (In a real app, you would also allow the Restaurant Owner to view it)
-    if order.customer_id != current_user.id:
+    # AUTH CHECK: the customer who placed it, or the owner of its restaurant
+    if not await auth.order_party(order, current_user, db):
         raise HTTPException(status_code=403, detail="Not authorized to view this order")
         
     return order
 
-# 3. UPDATE STATUS (SECURE)
-@router.patch("/{order_id}/status", response_model=schemas.OrderResponse)
+# 4. UPDATE STATUS (SECURE)
+@router.patch("/{order_id}/status", response_model=schemas.OrderResponse, dependencies=[Depends(ratelimit.limit("orders.status"))])
 async def update_order_status(
     order_id: int, 
     status: schemas.OrderStatus, 
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user) # REQUIRE LOGIN
 ):
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = await db.get(models.OrderDB, order_id, options=[selectinload(models.OrderDB.lines)])
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+
+    if not await auth.order_party(order, current_user, db):
+        raise HTTPException(status_code=403, detail="Not authorized to update this order")
     
-    # Update the status
-    order.status = status
-    db.commit()
-    db.refresh(order)
+    # Only valid moves (e.g. no "ready" -> "pending", nothing after "delivered")
+    if not lifecycle.can_transition(order.status, status.value):
+        raise HTTPException(status_code=409, detail=f"Cannot move order from '{order.status}' to '{status.value}'")
+
+    # Update the status (and re-arm or clear the automatic timer)
+    order.status = status.value
+    order.next_transition_at = lifecycle.next_transition_at(status.value)
+    await db.commit()
+    await status_manager.broadcast(_status_frame(order.id, order.status), order.id)
+    if order.restaurant_id is not None:
+        await kitchen_manager.broadcast(_status_frame(order.id, order.status), order.restaurant_id)
     
     # --- CHAT DELETION LOGIC ---
     # If the order is now closed, delete all chat messages
+    # (lines still queued in the chat writer are dropped there, see chat_writer._flush)
     if status in ["delivered", "cancelled"]: 
-        db.query(models.ChatMessageDB).filter(models.ChatMessageDB.order_id == order_id).delete()
-        db.commit()
-        print(f"Chat history for Order {order_id} has been wiped.")
+        await db.execute(delete(models.ChatMessageDB).filter(models.ChatMessageDB.order_id == order_id))
+        await db.commit()
+        logger.info("Chat history for Order %s has been wiped.", order_id)
+        locations.store.forget_order(order_id) # Stop streaming positions to it
         
-    return order
\ No newline at end of file
+    return order
+
+# 5. ORDER STATUS STREAM - SECURE (Using Query Param for Token)
+@router.websocket("/ws/{order_id}")
+async def order_status_stream(
+    websocket: WebSocket,
+    order_id: int,
+    token: str = Query(...), # Expect ?token=... in URL
+    db: AsyncSession = Depends(database.get_db)
+):
+    user = await auth.resolve_principal(token, db)
+    if not user:
+        await websocket.close(code=ws_status.WS_1008_POLICY_VIOLATION)
+        return
+
+    order = await db.get(models.OrderDB, order_id)
+    if not order:
+        await websocket.close(code=1000)
+        return
+
+    if not await auth.order_party(order, user, db):
+        await websocket.close(code=ws_status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # Register first so no transition is missed, then read the snapshot.
+    # A frame queued in between is at worst a repeat of the snapshot status.
+    conn = await status_manager.connect(websocket, order_id, paused=True)
+    await db.refresh(order, ["status", "lines"])
+    snapshot = schemas.OrderResponse.model_validate(order).model_dump()
+    await db.close() # Hand the pooled connection back: the socket may stay open for the whole order
+    await status_manager.send_first(conn, {"event": "snapshot", "order": snapshot})
+    status_manager.start(conn)
+
+    await status_manager.serve_push_only(conn)
+
+# 6. KITCHEN QUEUE (Restaurant owner) - oldest first, i.e. cooking order
+def _kitchen_queue(restaurant_id: int, statuses, after_id: int, limit: int):
+    # (restaurant_id, status, id) index: only this kitchen's orders in these states are read
+    return (
+        select(models.OrderDB)
+        .options(selectinload(models.OrderDB.lines))
+        .filter(
+            models.OrderDB.restaurant_id == restaurant_id,
+            models.OrderDB.status.in_(statuses),
+            models.OrderDB.id > after_id,
+        )
+        .order_by(models.OrderDB.id)
+        .limit(limit)
+    )
+
+@router.get("/restaurant/{restaurant_id}/queue", response_model=List[schemas.OrderResponse])
+async def get_kitchen_queue(
+    restaurant_id: int,
+    status: Optional[List[schemas.OrderStatus]] = Query(None), # Default: pending & cooking
+    after_id: int = Query(0, ge=0), # Cursor: id of the last order you already have
+    limit: int = Query(KITCHEN_QUEUE_PAGE_SIZE, ge=1, le=KITCHEN_QUEUE_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(database.get_read_db),
+    current_user: models.UserDB = Depends(auth.get_current_user)
+):
+    await _require_owner(restaurant_id, current_user, db)
+    statuses = [s.value for s in status] if status else KITCHEN_ACTIVE_STATUSES
+    orders = await db.scalars(_kitchen_queue(restaurant_id, statuses, after_id, limit))
+    return serialize.json_response([_order_record(order) for order in orders])
+
+# 7. KITCHEN FEED - SECURE (Using Query Param for Token)
+@router.websocket("/restaurant/{restaurant_id}/ws")
+async def kitchen_feed(
+    websocket: WebSocket,
+    restaurant_id: int,
+    token: str = Query(...), # Expect ?token=... in URL
+    db: AsyncSession = Depends(database.get_db)
+):
+    user = await auth.resolve_principal(token, db)
+    if not user:
+        await websocket.close(code=ws_status.WS_1008_POLICY_VIOLATION)
+        return
+    try:
+        await _require_owner(restaurant_id, user, db)
+    except HTTPException:
+        await websocket.close(code=ws_status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # Register first, then read the open queue: an order placed in between shows up
+    # in the snapshot AND as a new_order frame, clients key orders by id.
+    conn = await kitchen_manager.connect(websocket, restaurant_id, paused=True)
+    orders = [
+        _order_record(order) for order in
+        await db.scalars(_kitchen_queue(restaurant_id, KITCHEN_ACTIVE_STATUSES, 0, KITCHEN_QUEUE_MAX_PAGE_SIZE))
+    ]
+    await db.close() # Hand the pooled connection back: kitchen screens stay connected all day
+    # More open orders than one page: the rest via GET /orders/restaurant/{id}/queue?after_id=
+    next_after_id = orders[-1]["id"] if len(orders) == KITCHEN_QUEUE_MAX_PAGE_SIZE else None
+    await kitchen_manager.send_first(conn, {"event": "snapshot", "orders": orders, "next_after_id": next_after_id})
+    kitchen_manager.start(conn)
+
+    await kitchen_manager.serve_push_only(conn)
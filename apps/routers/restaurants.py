@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas, database, auth
+import heapq
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response, status
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload
+from typing import List, Optional
+from .. import models, schemas, database, auth, geo, catalog, ratelimit, serialize, ranking, locations
 
 router = APIRouter(prefix="/restaurants", tags=["Restaurant Admin"])
 
 # 1. CREATE RESTAURANT (User becomes Owner)
-@router.post("/", response_model=schemas.RestaurantResponse)
+@router.post("/", response_model=schemas.RestaurantResponse, dependencies=[Depends(ratelimit.limit("catalog.edit"))])
 async def create_restaurant(
     restaurant: schemas.RestaurantCreate,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
     new_restaurant = models.RestaurantDB(
@@ -21,20 +24,25 @@ async def create_restaurant(
         is_open=True
     )
     db.add(new_restaurant)
-    db.commit()
-    db.refresh(new_restaurant)
+    await db.commit()
+    await db.refresh(new_restaurant, ["menu_items"])
+    await ranking.snapshot.invalidate(new_restaurant.id)
     return new_restaurant
 
 # 2. UPDATE RESTAURANT (Only Owner can do this)
-@router.patch("/{restaurant_id}", response_model=schemas.RestaurantResponse)
+@router.patch("/{restaurant_id}", response_model=schemas.RestaurantResponse, dependencies=[Depends(ratelimit.limit("catalog.edit"))])
 async def update_restaurant(
     restaurant_id: int,
     updates: schemas.RestaurantUpdate,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
-    # Find Restaurant
-    r_db = db.query(models.RestaurantDB).filter(models.RestaurantDB.id == restaurant_id).first()
+    # Find Restaurant (menu is eager-loaded because the response embeds it)
+    r_db = await db.scalar(
+        select(models.RestaurantDB)
+        .options(selectinload(models.RestaurantDB.menu_items))
+        .filter(models.RestaurantDB.id == restaurant_id)
+    )
     if not r_db:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
@@ -47,38 +55,46 @@ async def update_restaurant(
     for key, value in update_data.items():
         setattr(r_db, key, value)
         
-    db.commit()
-    db.refresh(r_db)
+    await db.commit()
+    await catalog.cache.bump(restaurant_id) # Name / is_open show up in the menu feed
+    await ranking.snapshot.invalidate(restaurant_id)
     return r_db
 
 # 3. DELETE RESTAURANT (Only Owner)
-@router.delete("/{restaurant_id}")
+@router.delete("/{restaurant_id}", dependencies=[Depends(ratelimit.limit("catalog.edit"))])
 async def delete_restaurant(
     restaurant_id: int,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
-    r_db = db.query(models.RestaurantDB).filter(models.RestaurantDB.id == restaurant_id).first()
+    # Menu is loaded up front so the ORM can detach the items without lazy I/O
+    r_db = await db.scalar(
+        select(models.RestaurantDB)
+        .options(selectinload(models.RestaurantDB.menu_items))
+        .filter(models.RestaurantDB.id == restaurant_id)
+    )
     if not r_db:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
     if r_db.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this restaurant")
     
-    db.delete(r_db)
-    db.commit()
+    await db.delete(r_db)
+    await db.commit()
+    await catalog.cache.bump(restaurant_id)
+    await ranking.snapshot.invalidate(restaurant_id)
     return {"message": "Restaurant deleted successfully"}
 
 # 4. ADD MENU ITEM (Cuisines/Dishes)
-@router.post("/{restaurant_id}/menu", response_model=schemas.MenuItemResponse)
+@router.post("/{restaurant_id}/menu", response_model=schemas.MenuItemResponse, dependencies=[Depends(ratelimit.limit("catalog.edit"))])
 async def add_menu_item(
     restaurant_id: int,
     item: schemas.MenuItemCreate,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
     # Verify Restaurant and Owner
-    r_db = db.query(models.RestaurantDB).filter(models.RestaurantDB.id == restaurant_id).first()
+    r_db = await db.get(models.RestaurantDB, restaurant_id)
     if not r_db:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     if r_db.owner_id != current_user.id:
@@ -91,8 +107,9 @@ async def add_menu_item(
         restaurant_id=restaurant_id
     )
     db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
+    await db.commit()
+    await db.refresh(new_item)
+    await catalog.cache.bump(restaurant_id)
     
     # Return with restaurant name
     return schemas.MenuItemResponse(
@@ -104,15 +121,19 @@ async def add_menu_item(
     )
 
 # 6. UPDATE MENU ITEM (Price, Name, Desc)
-@router.patch("/menu/{item_id}", response_model=schemas.MenuItemResponse)
+@router.patch("/menu/{item_id}", response_model=schemas.MenuItemResponse, dependencies=[Depends(ratelimit.limit("catalog.edit"))])
 async def update_menu_item(
     item_id: int,
     updates: schemas.MenuItemUpdate,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
-    # 1. Find the Item
-    item_db = db.query(models.MenuItemDB).filter(models.MenuItemDB.id == item_id).first()
+    # 1. Find the Item (with its restaurant, needed for the owner check)
+    item_db = await db.scalar(
+        select(models.MenuItemDB)
+        .options(joinedload(models.MenuItemDB.restaurant))
+        .filter(models.MenuItemDB.id == item_id)
+    )
     if not item_db:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
@@ -126,8 +147,8 @@ async def update_menu_item(
     for key, value in update_data.items():
         setattr(item_db, key, value)
         
-    db.commit()
-    db.refresh(item_db)
+    await db.commit()
+    await catalog.cache.bump(item_db.restaurant_id)
     
     # 4. Return formatted response (we need restaurant name for the schema)
     return schemas.MenuItemResponse(
@@ -139,14 +160,18 @@ async def update_menu_item(
     )
 
 # 7. DELETE MENU ITEM
-@router.delete("/menu/{item_id}")
+@router.delete("/menu/{item_id}", dependencies=[Depends(ratelimit.limit("catalog.edit"))])
 async def delete_menu_item(
     item_id: int,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
     # 1. Find the Item
-    item_db = db.query(models.MenuItemDB).filter(models.MenuItemDB.id == item_id).first()
+    item_db = await db.scalar(
+        select(models.MenuItemDB)
+        .options(joinedload(models.MenuItemDB.restaurant))
+        .filter(models.MenuItemDB.id == item_id)
+    )
     if not item_db:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
@@ -155,25 +180,274 @@ async def delete_menu_item(
         raise HTTPException(status_code=403, detail="Not authorized to delete this item")
     
     # 3. Delete
-    db.delete(item_db)
-    db.commit()
+    restaurant_id = item_db.restaurant_id
+    await db.delete(item_db)
+    await db.commit()
+    await catalog.cache.bump(restaurant_id)
     
     return {"message": "Menu item deleted successfully"}
 
 # 5. PUBLIC: GET ALL MENU ITEMS (Feed for Users)
+# Keyset pagination: pass the id of the last item you got as `after_id`.
+# A page shorter than `limit` means you reached the end.
+# Pages are cached per catalog version and carry an ETag: send it back as
+# If-None-Match and an unchanged page costs a 304 and no database work.
+MENU_FEED_PAGE_SIZE = 100
+MENU_FEED_MAX_PAGE_SIZE = 500
+
+async def _render_menu_feed(stmt) -> bytes:
+    # Own (read-only) session: the request has no db dependency, a cache hit never opens one
+    async with database.ReadSessionLocal() as db:
+        result = await db.execute(stmt)
+        items = serialize.rows(result, schemas.MenuItemResponse)
+    return serialize.dumps(items)
+
 @router.get("/menu/all", response_model=List[schemas.MenuItemResponse])
-async def get_all_menu_items(db: Session = Depends(database.get_db)):
-    # Join tables to get restaurant name easily
-    items = db.query(models.MenuItemDB).all()
-    
-    response_list = []
-    for i in items:
-        # We fetch the parent restaurant to get the name
-        r_name = i.restaurant.name if i.restaurant else "Unknown"
-        response_list.append(
-            schemas.MenuItemResponse(
-                id=i.id, name=i.name, description=i.description, 
-                price=i.price, restaurant_name=r_name
+async def get_all_menu_items(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(MENU_FEED_PAGE_SIZE, ge=1, le=MENU_FEED_MAX_PAGE_SIZE),
+    restaurant_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    is_open: Optional[bool] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    key = ("menu", after_id, limit, restaurant_id, min_price, max_price, is_open)
+    version = catalog.cache.version(restaurant_id) # Read before the query (see CatalogCache.put)
+    cached = catalog.cache.get(key, version)
+    if cached is not None:
+        etag, body = cached
+    else:
+        # One join for the restaurant name, plain rows instead of ORM objects
+        stmt = (
+            select(
+                models.MenuItemDB.id,
+                models.MenuItemDB.name,
+                models.MenuItemDB.description,
+                models.MenuItemDB.price,
+                func.coalesce(models.RestaurantDB.name, "Unknown").label("restaurant_name"),
             )
+            .outerjoin(models.RestaurantDB, models.MenuItemDB.restaurant_id == models.RestaurantDB.id)
+            .filter(models.MenuItemDB.id > after_id)
+        )
+        if restaurant_id is not None:
+            stmt = stmt.filter(models.MenuItemDB.restaurant_id == restaurant_id)
+        if min_price is not None:
+            stmt = stmt.filter(models.MenuItemDB.price >= min_price)
+        if max_price is not None:
+            stmt = stmt.filter(models.MenuItemDB.price <= max_price)
+        if is_open is not None:
+            stmt = stmt.filter(models.RestaurantDB.is_open == is_open)
+        stmt = stmt.order_by(models.MenuItemDB.id).limit(limit)
+
+        body = await _render_menu_feed(stmt)
+        etag = catalog.make_etag(body)
+        catalog.cache.put(key, version, etag, body)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} # Always revalidate, usually a 304
+    if catalog.etag_matches(if_none_match, etag):
+        catalog.cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# 8. NEARBY RESTAURANTS (Geo Search around the caller)
+async def _open_restaurants_in_box(db: AsyncSession, latitude: float, longitude: float, radius_km: float):
+    # R*Tree narrows the search to the bounding box of the circle
+    min_lat, max_lat, min_lng, max_lng = geo.bounding_box(latitude, longitude, radius_km)
+    box = geo.restaurants_rtree.c
+    result = await db.execute(
+        select(
+            models.RestaurantDB.id,
+            models.RestaurantDB.name,
+            models.RestaurantDB.cuisine_type,
+            models.RestaurantDB.rating,
+            models.RestaurantDB.latitude,
+            models.RestaurantDB.longitude,
         )
-    return response_list
\ No newline at end of file
+        .join(geo.restaurants_rtree, box.id == models.RestaurantDB.id)
+        .filter(
+            box.min_lat <= max_lat, box.max_lat >= min_lat,
+            box.min_lng <= max_lng, box.max_lng >= min_lng,
+            models.RestaurantDB.is_open == True,
+        )
+    )
+    return result.all()
+
+async def _caller_location(db: AsyncSession, user: models.UserDB, latitude: Optional[float], longitude: Optional[float]):
+    # Default to where the user is now (live tracking), else their saved delivery location
+    if latitude is None or longitude is None:
+        live = locations.store.position(user.id)
+        if live:
+            return live
+        location = await db.get(models.UserLocationDB, user.id)
+        if not location or location.latitude is None or location.longitude is None:
+            raise HTTPException(status_code=400, detail="No saved location, pass latitude & longitude")
+        latitude, longitude = location.latitude, location.longitude
+    return latitude, longitude
+
+@router.get("/nearby", response_model=List[schemas.NearbyRestaurant])
+async def get_nearby_restaurants(
+    radius_km: float = Query(5.0, gt=0, le=50),
+    k: int = Query(20, ge=1, le=100),
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    db: AsyncSession = Depends(database.get_read_db),
+    current_user: models.UserDB = Depends(auth.get_current_user)
+):
+    latitude, longitude = await _caller_location(db, current_user, latitude, longitude)
+
+    # Start with a small circle and double it until it holds k restaurants.
+    # Everything inside the circle has been seen, so its k closest are exact.
+    search_km = radius_km / 8
+    while True:
+        rows = await _open_restaurants_in_box(db, latitude, longitude, search_km)
+        hits = []
+        for r in rows:
+            d = geo.haversine_km(latitude, longitude, r.latitude, r.longitude)
+            if d <= search_km:
+                hits.append((d, r))
+        if len(hits) >= k or search_km >= radius_km:
+            break
+        search_km = min(radius_km, search_km * 2)
+
+    nearest = heapq.nsmallest(k, hits, key=lambda pair: pair[0])
+    return serialize.json_response([
+        {
+            "id": r.id, "name": r.name, "cuisine_type": r.cuisine_type, "rating": r.rating or 0.0,
+            "latitude": r.latitude, "longitude": r.longitude, "distance_km": round(d, 3),
+        }
+        for d, r in nearest
+    ])
+
+# 9. CATALOG CACHE METRICS (Admin only)
+@router.get("/catalog/metrics")
+async def get_catalog_metrics(current_user: models.UserDB = Depends(auth.get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+    return catalog.cache.metrics()
+
+# 10. HOME FEED (Personalized ranking around the caller)
+# Score = sooner delivery (ETA) + rating + how often you order that cuisine.
+# Ranked in memory over every open restaurant in radius_km, see apps/ranking.py.
+FEED_HISTORY_ORDERS = 50 # Recent orders that make up the cuisine preference
+
+async def _cuisine_affinity(db: AsyncSession, user: models.UserDB) -> dict:
+    # Index-only walk over the newest orders; their cuisines come from the snapshot
+    restaurant_ids = await db.scalars(
+        select(models.OrderDB.restaurant_id)
+        .filter(models.OrderDB.customer_id == user.id, models.OrderDB.restaurant_id.is_not(None))
+        .order_by(models.OrderDB.id.desc())
+        .limit(FEED_HISTORY_ORDERS)
+    )
+    counts = {}
+    for restaurant_id in restaurant_ids:
+        slot = ranking.snapshot.slots.get(restaurant_id)
+        if slot is not None:
+            cuisine_type = ranking.snapshot.rows[slot][2]
+            counts[cuisine_type] = counts.get(cuisine_type, 0) + 1
+    favourite = max(counts.values(), default=0)
+    return {cuisine_type: n / favourite for cuisine_type, n in counts.items()}
+
+@router.get("/feed", response_model=List[schemas.FeedRestaurant])
+async def get_home_feed(
+    limit: int = Query(20, ge=1, le=100),
+    radius_km: float = Query(10.0, gt=0, le=50),
+    cuisine: Optional[List[str]] = Query(None), # Only these cuisines
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    db: AsyncSession = Depends(database.get_read_db),
+    current_user: models.UserDB = Depends(auth.get_current_user)
+):
+    latitude, longitude = await _caller_location(db, current_user, latitude, longitude)
+    await ranking.snapshot.sync()
+    affinity = await _cuisine_affinity(db, current_user)
+    ranked = ranking.snapshot.rank(latitude, longitude, radius_km, limit, affinity, cuisine)
+    return serialize.json_response([
+        {
+            "id": r[0], "name": r[1], "cuisine_type": r[2], "rating": r[3], "latitude": r[4], "longitude": r[5],
+            "distance_km": round(distance, 3), "eta_minutes": round(eta), "score": round(score, 4),
+        }
+        for r, distance, eta, score in ranked
+    ])
+
+# 6. PUBLIC: LIST RESTAURANTS / 7. GET ONE RESTAURANT
+# Declared last: GET /{restaurant_id} would otherwise swallow /nearby, /menu/all, ...
+# fields= picks what every restaurant carries:
+#   (default)             the card + its menu
+#   summary               the card only, for list screens
+#   id,name,rating        just these card fields (id is always sent, it is the cursor)
+#   summary,menu_items    same as the default
+RESTAURANT_PAGE_SIZE = 20
+RESTAURANT_MAX_PAGE_SIZE = 100
+CARD_FIELDS = ("id", "name", "cuisine_type", "rating", "is_open", "latitude", "longitude", "owner_id")
+
+def _parse_fields(fields: Optional[str]) -> tuple:
+    """-> (card columns to select, whether to attach menus)"""
+    if fields is None:
+        return CARD_FIELDS, True
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    include_menu = "menu_items" in wanted
+    if "summary" in wanted:
+        wanted.update(CARD_FIELDS)
+    wanted -= {"summary", "menu_items"}
+    unknown = wanted - set(CARD_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(f for f in CARD_FIELDS if f in wanted or f == "id"), include_menu
+
+async def _restaurant_cards(db: AsyncSession, stmt, columns: tuple, include_menu: bool) -> list:
+    # Plain rows of the requested columns, then every menu in ONE more query:
+    # two statements per page no matter how many restaurants it holds
+    rows = (await db.execute(stmt)).all()
+    cards = [dict(zip(columns, row)) for row in rows]
+    if include_menu and cards:
+        menus = {card["id"]: [] for card in cards}
+        item = models.MenuItemDB
+        result = await db.execute(
+            select(item.id, item.name, item.description, item.price, item.restaurant_id)
+            .filter(item.restaurant_id.in_(menus))
+            .order_by(item.restaurant_id, item.id)
+        )
+        for row in result:
+            menus[row.restaurant_id].append(
+                {"id": row.id, "name": row.name, "description": row.description, "price": row.price}
+            )
+        for card in cards:
+            card["menu_items"] = menus[card["id"]]
+    return cards
+
+@router.get("", response_model=List[schemas.RestaurantCard])
+@router.get("/", response_model=List[schemas.RestaurantCard], include_in_schema=False)
+async def list_restaurants(
+    cuisine: Optional[str] = None,
+    is_open: Optional[bool] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    after_id: int = Query(0, ge=0), # Keyset cursor: id of the last restaurant you got
+    limit: int = Query(RESTAURANT_PAGE_SIZE, ge=1, le=RESTAURANT_MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    columns, include_menu = _parse_fields(fields)
+    # (cuisine_type, is_open, id) / (is_open, id) indexes: filtered and already in id order
+    stmt = select(*(getattr(models.RestaurantDB, c) for c in columns)).filter(models.RestaurantDB.id > after_id)
+    if cuisine is not None:
+        stmt = stmt.filter(models.RestaurantDB.cuisine_type == cuisine)
+    if is_open is not None:
+        stmt = stmt.filter(models.RestaurantDB.is_open == is_open)
+    if min_rating is not None:
+        stmt = stmt.filter(models.RestaurantDB.rating >= min_rating)
+    stmt = stmt.order_by(models.RestaurantDB.id).limit(limit)
+    return serialize.json_response(await _restaurant_cards(db, stmt, columns, include_menu))
+
+@router.get("/{restaurant_id}", response_model=schemas.RestaurantCard)
+async def get_restaurant(
+    restaurant_id: int,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    columns, include_menu = _parse_fields(fields)
+    stmt = select(*(getattr(models.RestaurantDB, c) for c in columns)).filter(models.RestaurantDB.id == restaurant_id)
+    cards = await _restaurant_cards(db, stmt, columns, include_menu)
+    if not cards:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return serialize.json_response(cards[0])
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from enum import Enum
+from .. import schemas, database, fulltext, serialize
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+class SearchScope(str, Enum):
+    ALL = "all"
+    DISHES = "dishes"
+    RESTAURANTS = "restaurants"
+
+# bm25() weights: a hit in the name counts more than one in description/cuisine
+DISH_SEARCH_SQL = text("""
+    SELECT m.id, m.name, m.description, m.price, m.restaurant_id,
+           r.name AS restaurant_name,
+           bm25(menu_items_fts, 10.0, 1.0) AS score
+    FROM menu_items_fts
+    JOIN menu_items m ON m.id = menu_items_fts.rowid
+    LEFT JOIN restaurants r ON r.id = m.restaurant_id
+    WHERE menu_items_fts MATCH :match
+    ORDER BY score
+    LIMIT :limit OFFSET :offset
+""")
+
+RESTAURANT_SEARCH_SQL = text("""
+    SELECT r.id, r.name, r.cuisine_type, r.rating, r.is_open,
+           bm25(restaurants_fts, 10.0, 3.0) AS score
+    FROM restaurants_fts
+    JOIN restaurants r ON r.id = restaurants_fts.rowid
+    WHERE restaurants_fts MATCH :match
+    ORDER BY score
+    LIMIT :limit OFFSET :offset
+""")
+
+# 1. PUBLIC: RANKED SEARCH OVER DISHES & RESTAURANTS
+@router.get("", response_model=schemas.SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    scope: SearchScope = SearchScope.ALL,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    response = {"query": q, "dishes": [], "restaurants": []}
+    match = fulltext.to_match_query(q)
+    if not match:
+        return serialize.json_response(response)
+
+    params = {"match": match, "limit": limit, "offset": offset}
+    if scope in (SearchScope.ALL, SearchScope.DISHES):
+        rows = (await db.execute(DISH_SEARCH_SQL, params)).all()
+        response["dishes"] = [
+            {
+                "id": r.id, "name": r.name, "description": r.description, "price": r.price or 0.0,
+                "restaurant_id": r.restaurant_id, "restaurant_name": r.restaurant_name,
+                "score": -r.score, # bm25 is "lower is better", flip it for clients
+            }
+            for r in rows
+        ]
+    if scope in (SearchScope.ALL, SearchScope.RESTAURANTS):
+        rows = (await db.execute(RESTAURANT_SEARCH_SQL, params)).all()
+        response["restaurants"] = [
+            {
+                "id": r.id, "name": r.name, "cuisine_type": r.cuisine_type, "rating": r.rating or 0.0,
+                "is_open": bool(r.is_open), "score": -r.score,
+            }
+            for r in rows
+        ]
+    return serialize.json_response(response)
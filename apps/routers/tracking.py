@@ -0,0 +1,152 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status as ws_status
+from pydantic import ValidationError
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from .. import models, schemas, database, auth, locations, realtime
+
+router = APIRouter(prefix="/locations", tags=["Live Tracking"])
+
+# --- WATCHERS ---
+# Rooms are orders. Positions shared with an order reach its watchers once per
+# LOCATION_STREAM_SECONDS at most, newest position only (see apps/locations.py).
+watch_manager = realtime.ConnectionManager("location")
+
+def _position_frame(user_id: int, latitude: float, longitude: float, recorded_at: float) -> dict:
+    return {"user_id": user_id, "latitude": latitude, "longitude": longitude, "recorded_at": recorded_at}
+
+async def _publish_positions(updates: list):
+    # One frame per (order, user) that moved, one backplane write per tick
+    await watch_manager.broadcast_many([
+        ({"event": "location", **_position_frame(user_id, lat, lng, recorded_at)}, order_id)
+        for order_id, user_id, lat, lng, recorded_at in updates
+    ])
+
+locations.store.listeners.append(_publish_positions)
+
+async def _open_order_party(order_id: int, user: models.UserDB, db: AsyncSession) -> bool:
+    # Only the customer and the restaurant owner, and only while the order is still open
+    order = await db.get(models.OrderDB, order_id)
+    if not order or order.status in ("delivered", "cancelled"):
+        return False
+    return await auth.order_party(order, user, db) is not None
+
+async def _may_share(order_id: Optional[int], user: models.UserDB, db: AsyncSession) -> bool:
+    # Checked once per (order, user): later pings find the user in store.sharing
+    if order_id is None or user.id in locations.store.sharing.get(order_id, ()):
+        return True
+    return await _open_order_party(order_id, user, db)
+
+# Endpoints
+
+# 1. MY SAVED LOCATION (Delivery address)
+@router.get("/me", response_model=schemas.UserLocationResponse)
+async def get_my_location(
+    db: AsyncSession = Depends(database.get_read_db),
+    current_user: models.UserDB = Depends(auth.get_current_user)
+):
+    location = await db.get(models.UserLocationDB, current_user.id)
+    result = {"user_id": current_user.id, "address_label": None, "address_text": None, "latitude": None, "longitude": None}
+    if location:
+        result.update(schemas.UserLocationResponse.model_validate(location).model_dump())
+    live = locations.store.position(current_user.id) # Newer than the table until the next flush
+    if live:
+        result["latitude"], result["longitude"] = live
+    return result
+
+# 2. UPDATE MY SAVED LOCATION
+@router.patch("/me", response_model=schemas.UserLocationResponse)
+async def update_my_location(
+    updates: schemas.UserLocationUpdate,
+    db: AsyncSession = Depends(database.get_db),
+    current_user: models.UserDB = Depends(auth.get_current_user)
+):
+    update_data = updates.model_dump(exclude_unset=True)
+    if ("latitude" in update_data) != ("longitude" in update_data):
+        raise HTTPException(status_code=400, detail="Send latitude and longitude together")
+
+    stmt = insert(models.UserLocationDB).values(user_id=current_user.id, **update_data)
+    if update_data:
+        stmt = stmt.on_conflict_do_update(index_elements=[models.UserLocationDB.user_id], set_=update_data)
+    else:
+        stmt = stmt.on_conflict_do_nothing()
+    await db.execute(stmt)
+    await db.commit()
+    location = await db.get(models.UserLocationDB, current_user.id, populate_existing=True)
+    if "latitude" in update_data:
+        locations.store.remember(current_user.id, location.latitude, location.longitude)
+    return await get_my_location(db, current_user)
+
+# 3. LOCATION PINGS (HTTP batch)
+@router.post("/pings", response_model=schemas.LocationIngestResult)
+async def ingest_pings(
+    batch: schemas.LocationBatch,
+    db: AsyncSession = Depends(database.get_read_db),
+    current_user: models.UserDB = Depends(auth.get_current_user)
+):
+    for order_id in {ping.order_id for ping in batch.pings}:
+        if not await _may_share(order_id, current_user, db):
+            raise HTTPException(status_code=403, detail=f"Not authorized to share your location with order {order_id}")
+
+    # Buffered pings may arrive out of order: oldest first, so the newest one wins
+    accepted = 0
+    for ping in sorted(batch.pings, key=lambda p: p.recorded_at or 0):
+        accepted += locations.store.ingest(current_user.id, ping.latitude, ping.longitude, ping.recorded_at, ping.order_id)
+    return {"accepted": accepted, "dropped": len(batch.pings) - accepted}
+
+# 4. LOCATION PINGS (WebSocket) - SECURE (Using Query Param for Token)
+# Send {"latitude": .., "longitude": .., "recorded_at": ..} (or a list of them) as JSON text
+# frames, or binary frames in the negotiated format. Nothing is sent back unless a frame is invalid.
+@router.websocket("/ws")
+async def ingest_stream(
+    websocket: WebSocket,
+    token: str = Query(...), # Expect ?token=... in URL
+    order_id: Optional[int] = Query(None), # Share every ping with this order's watchers
+    db: AsyncSession = Depends(database.get_db)
+):
+    user = await auth.resolve_principal(token, db)
+    if not user or not await _may_share(order_id, user, db):
+        await websocket.close(code=ws_status.WS_1008_POLICY_VIOLATION)
+        return
+    await db.close() # Hand the pooled connection back: trackers stay connected for the whole trip
+    fmt = await realtime.accept(websocket)
+
+    try:
+        while True:
+            try:
+                data = await realtime.receive_json(websocket, fmt)
+                batch = [schemas.LocationPing.model_validate(ping) for ping in (data if isinstance(data, list) else [data])]
+            except (ValueError, ValidationError): # Does not decode, or not pings
+                await realtime.send_json(websocket, fmt, {"event": "invalid"})
+                continue
+            if order_id is not None and user.id not in locations.store.sharing.get(order_id, ()):
+                # Not shared any more (order closed, or another worker): check again
+                async with database.ReadSessionLocal() as check_db:
+                    if not await _open_order_party(order_id, user, check_db):
+                        order_id = None
+            for ping in batch:
+                locations.store.ingest(user.id, ping.latitude, ping.longitude, ping.recorded_at, order_id)
+    except WebSocketDisconnect:
+        pass
+
+# 5. WATCH AN ORDER - SECURE (Using Query Param for Token)
+@router.websocket("/orders/{order_id}/ws")
+async def watch_order(
+    websocket: WebSocket,
+    order_id: int,
+    token: str = Query(...), # Expect ?token=... in URL
+    db: AsyncSession = Depends(database.get_db)
+):
+    user = await auth.resolve_principal(token, db)
+    if not user or not await _open_order_party(order_id, user, db):
+        await websocket.close(code=ws_status.WS_1008_POLICY_VIOLATION)
+        return
+    await db.close()
+
+    # Register first, then snapshot: a position in between arrives twice at worst
+    conn = await watch_manager.connect(websocket, order_id, paused=True)
+    positions = [_position_frame(*position) for position in locations.store.order_positions(order_id)]
+    await watch_manager.send_first(conn, {"event": "snapshot", "positions": positions})
+    watch_manager.start(conn)
+
+    await watch_manager.serve_push_only(conn)
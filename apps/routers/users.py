@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 # .. means go up one level to access models/schemas
 from .. import models, schemas, database, auth 
@@ -8,14 +9,14 @@ router = APIRouter(prefix="/users", tags=["Authentication & Users"])
 
 # 1. REGISTER USER (Now with Role support)
 @router.post("/register", response_model=schemas.UserResponse)
-async def register_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_db)):
     # 1. Check if user exists
-    db_user = db.query(models.UserDB).filter(models.UserDB.username == user.username).first()
+    db_user = await db.scalar(select(models.UserDB).filter(models.UserDB.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
     # 2. Create new user with HASHED password and ROLE
-    hashed_pwd = auth.get_password_hash(user.password)
+    hashed_pwd = await auth.get_password_hash_async(user.password)
     new_user = models.UserDB(
         username=user.username, 
         email=user.email, 
@@ -23,8 +24,8 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(database
         role=user.role # This comes from the Schema (defaults to "customer")
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     # 3. Return the user object
     # The Schema (UserResponse) will filter out the password and include the role
@@ -32,14 +33,14 @@ async def register_user(user: schemas.UserCreate, db: Session = Depends(database
 
 # 2. LOGIN (Returns Token)
 @router.post("/login", response_model=schemas.Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_db)):
     # 1. Find User
-    user = db.query(models.UserDB).filter(models.UserDB.username == form_data.username).first()
+    user = await db.scalar(select(models.UserDB).filter(models.UserDB.username == form_data.username))
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     
     # 2. Check Password
-    if not auth.verify_password(form_data.password, user.hashed_password):
+    if not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     
     # 3. Return Token
@@ -56,18 +57,18 @@ async def read_users_me(current_user: models.UserDB = Depends(auth.get_current_u
 @router.patch("/me", response_model=schemas.UserResponse)
 async def update_user_me(
     updates: schemas.UserUpdate,
-    db: Session = Depends(database.get_db),
+    db: AsyncSession = Depends(database.get_db),
     current_user: models.UserDB = Depends(auth.get_current_user)
 ):
     # A. Check Email Uniqueness (If they are changing email)
     if updates.email and updates.email != current_user.email:
-        existing_email = db.query(models.UserDB).filter(models.UserDB.email == updates.email).first()
+        existing_email = await db.scalar(select(models.UserDB).filter(models.UserDB.email == updates.email))
         if existing_email:
             raise HTTPException(status_code=400, detail="Email already currently in use")
             
     # B. Check Username Uniqueness
     if updates.username and updates.username != current_user.username:
-        existing_user = db.query(models.UserDB).filter(models.UserDB.username == updates.username).first()
+        existing_user = await db.scalar(select(models.UserDB).filter(models.UserDB.username == updates.username))
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already taken")
 
@@ -77,11 +78,15 @@ async def update_user_me(
     for key, value in update_data.items():
         # SECURITY CRITICAL: If updating password, Hash it first!
         if key == "password":
-            hashed_value = auth.get_password_hash(value)
+            hashed_value = await auth.get_password_hash_async(value)
             setattr(current_user, "hashed_password", hashed_value)
         else:
             setattr(current_user, key, value)
             
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+
+    # D. Cached principals for this user are stale now (old username/password)
+    if update_data.keys() & {"username", "email", "password"}:
+        await auth.principal_cache.invalidate_user(current_user.id)
     return current_user
\ No newline at end of file
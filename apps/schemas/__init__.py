@@ -1,9 +1,14 @@
 from .auth import Token, TokenData
 from .users import UserCreate, UserUpdate, UserResponse
-from .locations import UserLocation, UserLocationUpdate
+from .locations import (
+    UserLocation, UserLocationUpdate, UserLocationResponse,
+    LocationPing, LocationBatch, LocationIngestResult
+)
 from .restaurants import (
     MenuItemCreate, MenuItemUpdate, MenuItemResponse,
-    RestaurantCreate, RestaurantUpdate, RestaurantResponse
+    RestaurantCreate, RestaurantUpdate, RestaurantResponse, RestaurantCard,
+    NearbyRestaurant, FeedRestaurant
 )
-from .orders import OrderStatus, OrderCreate, OrderResponse
+from .orders import OrderStatus, OrderLineCreate, OrderLineResponse, OrderCreate, OrderResponse
 from .chat import ChatMessageCreate, ChatMessageResponse, ChatMessageUpdate
+from .search import DishSearchHit, RestaurantSearchHit, SearchResponse
@@ -4,6 +4,7 @@ class ChatMessageCreate(BaseModel):
     message: str
 
 class ChatMessageResponse(BaseModel):
+    id: int # Use as the after_id / last_seen_id cursor
     sender_type: str # "user" or "restaurant"
     message: str
     timestamp: str
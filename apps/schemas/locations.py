@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+import time
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
 
 class UserLocation(BaseModel):
     address_label: str
@@ -13,4 +14,33 @@ class UserLocationUpdate(BaseModel):
     address_label: Optional[str] = None
     address_text: Optional[str] = None
     latitude: Optional[float] = None
-    longitude: Optional[float] = None
\ No newline at end of file
+    longitude: Optional[float] = None
+
+class UserLocationResponse(UserLocationUpdate):
+    user_id: int
+    class Config:
+        from_attributes = True
+
+# --- LIVE TRACKING ---
+PING_MAX_CLOCK_AHEAD_SECONDS = 300 # Device clocks run ahead; milliseconds are far beyond this
+
+class LocationPing(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    recorded_at: Optional[float] = None # Unix time on the device; defaults to arrival time
+    order_id: Optional[int] = None # Share this position with the watchers of the order
+
+    @field_validator("recorded_at")
+    @classmethod
+    def check_recorded_at(cls, v):
+        # One bad clock must not make every later ping look stale
+        if v is not None and not 0 < v <= time.time() + PING_MAX_CLOCK_AHEAD_SECONDS:
+            raise ValueError("recorded_at must be Unix time in seconds, not in the future")
+        return v
+
+class LocationBatch(BaseModel):
+    pings: List[LocationPing] = Field(..., min_length=1, max_length=100) # Phones send what they buffered
+
+class LocationIngestResult(BaseModel):
+    accepted: int
+    dropped: int # Jitter or older than the last kept ping
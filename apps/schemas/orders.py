@@ -1,18 +1,43 @@
 from pydantic import BaseModel
+from typing import List, Optional
 from enum import Enum
 
 class OrderStatus(str, Enum):
     PENDING = "pending"
     COOKING = "cooking"
     READY = "ready"
+    DELIVERED = "delivered"
+    CANCELLED = "cancelled"
 
+# --- CART LINES ---
+class OrderLineCreate(BaseModel):
+    menu_item_id: int
+    quantity: int = 1
+
+class OrderLineResponse(OrderLineCreate):
+    item_name: str
+    unit_price: float # Price when the order was placed, not today's menu price
+    class Config:
+        from_attributes = True
+
+# --- ORDERS ---
 class OrderCreate(BaseModel):
+    # Cart: one order, many menu items
+    items: List[OrderLineCreate] = []
+    # Legacy single free-text item (used when `items` is empty)
+    item_name: Optional[str] = None
+    quantity: Optional[int] = None
+    customer_id: Optional[int] = None # Ignored: the order belongs to the token owner
+    restaurant_id: Optional[int] = None # Legacy orders only: cart orders go to the restaurant of their items
+
+class OrderResponse(BaseModel):
+    id: int
     item_name: str
     quantity: int
     customer_id: int
-
-class OrderResponse(OrderCreate):
-    id: int
+    restaurant_id: Optional[int] = None
     status: str
+    total_price: Optional[float] = None
+    lines: List[OrderLineResponse] = []
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
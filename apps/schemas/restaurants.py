@@ -39,4 +39,38 @@ class RestaurantResponse(RestaurantCreate):
     owner_id: int
     menu_items: List[MenuItemResponse] = [] 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class RestaurantCard(BaseModel):
+    """GET /restaurants: only the fields asked for with fields= are sent."""
+    id: int
+    name: Optional[str] = None
+    cuisine_type: Optional[str] = None
+    rating: Optional[float] = None
+    is_open: Optional[bool] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    owner_id: Optional[int] = None
+    menu_items: Optional[List[MenuItemResponse]] = None
+
+# --- GEO SEARCH ---
+class NearbyRestaurant(BaseModel):
+    id: int
+    name: str
+    cuisine_type: str
+    rating: float
+    latitude: float
+    longitude: float
+    distance_km: float
+
+# --- HOME FEED ---
+class FeedRestaurant(BaseModel):
+    id: int
+    name: str
+    cuisine_type: str
+    rating: float
+    latitude: float
+    longitude: float
+    distance_km: float
+    eta_minutes: int
+    score: float
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class DishSearchHit(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    price: float
+    restaurant_id: Optional[int] = None
+    restaurant_name: Optional[str] = None
+    score: float
+
+class RestaurantSearchHit(BaseModel):
+    id: int
+    name: str
+    cuisine_type: Optional[str] = None
+    rating: float
+    is_open: bool
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    dishes: List[DishSearchHit] = []
+    restaurants: List[RestaurantSearchHit] = []
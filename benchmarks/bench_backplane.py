@@ -0,0 +1,115 @@
+"""
+Multi-process chat delivery through the SQLite backplane.
+
+Starts two real uvicorn processes (worker A and worker B) on the same database
+with URBANPLATE_CHAT_BACKPLANE=sqlite. A WebSocket is connected to each
+worker, messages are posted over HTTP to worker A, and we measure when each
+socket sees them. Then both workers stay quiet until the log is pruned, and one
+more message must still reach worker B. Exits non-zero if any message is not
+delivered cross-worker.
+
+    python -m benchmarks.bench_backplane [--messages 200]
+
+Needs uvicorn and websockets installed.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks import common
+
+import httpx
+import websockets
+
+PORTS = (8761, 8762)
+RETENTION_SECONDS = 1 # Short, so the quiet period below empties the log
+
+
+async def start_workers(procs):
+    env = dict(os.environ, URBANPLATE_CHAT_BACKPLANE="sqlite", URBANPLATE_BACKPLANE_RETENTION_SECONDS=str(RETENTION_SECONDS))
+    # One at a time: the first worker creates the schema on the scratch database
+    for port in PORTS:
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "apps.main:app", "--port", str(port), "--log-level", "warning"],
+            env=env,
+        ))
+        await wait_ready(f"http://127.0.0.1:{port}")
+
+
+async def wait_ready(url):
+    async with httpx.AsyncClient() as c:
+        for _ in range(100):
+            try:
+                await c.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start")
+
+
+async def collect(ws, n, received):
+    for _ in range(n):
+        frame = await ws.recv()
+        received.append((time.perf_counter(), frame))
+
+
+async def main(messages: int, procs):
+    await start_workers(procs)
+    a, b = (f"http://127.0.0.1:{port}" for port in PORTS)
+
+    async with httpx.AsyncClient(base_url=a) as c:
+        headers = await common.auth_headers(c, "bench_backplane")
+        token = headers["Authorization"].split()[1]
+        r = await c.post("/orders/place", json={"item_name": "momo", "quantity": 1, "customer_id": 0}, headers=headers)
+        order_id = r.json()["id"]
+
+        ws_path = f"/chat/ws/{order_id}/user?token={token}"
+        async with websockets.connect(a.replace("http", "ws") + ws_path) as ws_a, \
+                websockets.connect(b.replace("http", "ws") + ws_path) as ws_b:
+            got_a, got_b = [], []
+            readers = [
+                asyncio.create_task(collect(ws_a, messages, got_a)),
+                asyncio.create_task(collect(ws_b, messages, got_b)),
+            ]
+            sent = []
+            for i in range(messages):
+                sent.append(time.perf_counter())
+                await c.post(f"/chat/{order_id}/user/send", json={"message": f"msg {i}"}, headers=headers)
+                await asyncio.sleep(0.005)
+            try:
+                await asyncio.wait_for(asyncio.gather(*readers), timeout=10)
+            except asyncio.TimeoutError:
+                pass
+
+            # Quiet for longer than the retention: every event is old enough to prune
+            await asyncio.sleep(RETENTION_SECONDS * 3)
+            await c.post(f"/chat/{order_id}/user/send", json={"message": "after quiet"}, headers=headers)
+            after_quiet = []
+            try:
+                await asyncio.wait_for(collect(ws_b, 1, after_quiet), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+
+    common.report("same worker (A -> A)", [(t - s) * 1000 for s, (t, _) in zip(sent, got_a)])
+    common.report("cross worker (A -> B)", [(t - s) * 1000 for s, (t, _) in zip(sent, got_b)])
+    in_order = [f for _, f in got_b] == [f for _, f in got_a]
+    print(f"delivered A={len(got_a)}/{messages} B={len(got_b)}/{messages} same order={in_order}")
+    print(f"delivered to B after a quiet period: {bool(after_quiet)}")
+    return len(got_b) == messages and in_order and bool(after_quiet)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+    procs = []
+    try:
+        ok = asyncio.run(main(args.messages, procs))
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,54 @@
+"""
+Chat persistence throughput: one transaction per message (the old path) vs.
+the group-commit writer.
+
+    python -m benchmarks.bench_chat_writer [--producers 32] [--messages 50]
+
+"per-message" uses batch_size=1, so every line is its own commit like before.
+Both runs go through POST /chat/{order_id}/user/send end to end.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks import common
+from apps.main import app
+from apps import chat_writer
+
+
+async def run(c, headers, order_ids, messages):
+    async def producer(order_id):
+        for i in range(messages):
+            await c.post(f"/chat/{order_id}/user/send", json={"message": f"line {i}"}, headers=headers)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(order_id) for order_id in order_ids))
+    return time.perf_counter() - start
+
+
+async def main(producers: int, messages: int):
+    async with common.client(app) as c:
+        headers = await common.auth_headers(c, "bench_chat_writer")
+        order_ids = []
+        for _ in range(producers):
+            order_ids.append(await common.place_order(c, headers))
+
+        total = producers * messages
+        for label, writer in (
+            ("per-message commit", chat_writer.ChatWriter(batch_size=1, flush_ms=0)),
+            ("group commit", chat_writer.ChatWriter()),
+        ):
+            chat_writer.writer = writer
+            elapsed = await run(c, headers, order_ids, messages)
+            print(
+                f"{label:<20} messages={total:<6} msgs/s={total / elapsed:8.1f} "
+                f"commits={writer.batches:<6} avg batch={writer.messages / max(writer.batches, 1):6.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--producers", type=int, default=32)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.producers, args.messages))
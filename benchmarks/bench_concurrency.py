@@ -0,0 +1,57 @@
+"""
+p99 latency of GET /orders/{id} on its own, and again while chat messages and
+order placement hammer the same worker.
+
+    python -m benchmarks.bench_concurrency [--reads 500] [--writers 8]
+
+With the async DB layer the two p99 figures should stay close: writers wait on
+SQLite in the driver thread, not on the event loop.
+"""
+import argparse
+import asyncio
+
+from benchmarks import common
+from apps.main import app
+
+
+async def read_loop(c, headers, order_id, n):
+    samples = []
+    for _ in range(n):
+        samples.append(await common.timed(c.get(f"/orders/{order_id}", headers=headers)))
+    return samples
+
+
+async def chat_loop(c, headers, order_id, stop):
+    while not stop.is_set():
+        await c.post(f"/chat/{order_id}/user/send", json={"message": "where is my food?"}, headers=headers)
+
+
+async def order_loop(c, headers, stop):
+    while not stop.is_set():
+        await common.place_order(c, headers)
+
+
+async def main(reads: int, writers: int):
+
+    async with common.client(app) as c:
+        headers = await common.auth_headers(c, "bench_reader")
+        order_id = await common.place_order(c, headers)
+
+        common.report("GET /orders/{id} (idle)", await read_loop(c, headers, order_id, reads))
+
+        stop = asyncio.Event()
+        load = [asyncio.create_task(chat_loop(c, headers, order_id, stop)) for _ in range(writers)]
+        load += [asyncio.create_task(order_loop(c, headers, stop)) for _ in range(writers)]
+        samples = await read_loop(c, headers, order_id, reads)
+        stop.set()
+        await asyncio.gather(*load)
+
+        common.report(f"GET /orders/{{id}} (+{writers} chat, +{writers} orders)", samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=500)
+    parser.add_argument("--writers", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.reads, args.writers))
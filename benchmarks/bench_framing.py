@@ -0,0 +1,114 @@
+"""
+Bytes on the wire and server CPU per chat message for each WebSocket wire
+format (apps/framing.py), with and without burst batching.
+
+    python -m benchmarks.bench_framing [--sockets 100] [--messages 2000] [--burst 10]
+
+One room of `sockets` watchers, all on the same format; every message is
+broadcast through realtime.ConnectionManager to in-memory sockets that only
+count bytes. "permessage-deflate" is what uvicorn's transport compression does
+instead: one compressor per socket with context takeover, so every socket pays
+for its own compression.
+"""
+import argparse
+import asyncio
+import random
+import time
+import zlib
+
+from benchmarks import common  # noqa: F401 - scratch database, before apps
+from apps import framing, realtime
+from apps.backplane import LocalBackplane
+
+WORDS = "momo is on the way rider waiting outside extra spicy please no onions thanks ready in five minutes".split()
+
+
+class CountingSocket:
+    def __init__(self, fmt, batch: bool):
+        self.scope = {"subprotocols": [fmt] if fmt else []}
+        self.query_params = {"batch": "1"} if batch else {}
+        self.frames = 0
+        self.bytes = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames += 1
+        self.bytes += len(text.encode())
+
+    async def send_bytes(self, data: bytes):
+        self.frames += 1
+        self.bytes += len(data)
+
+
+def chat_messages(n: int) -> list:
+    rng = random.Random(3)
+    return [
+        {
+            "id": i + 1,
+            "sender_type": rng.choice(["user", "restaurant"]),
+            "message": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12))),
+            "timestamp": f"2026-10-17T12:{i // 60 % 60:02d}:{i % 60:02d}.{rng.randint(0, 999999):06d}",
+        }
+        for i in range(n)
+    ]
+
+
+async def run(fmt, batch: bool, sockets: int, messages: list, burst: int) -> tuple:
+    manager = realtime.ConnectionManager("bench", queue_size=len(messages) + 1, bus=LocalBackplane(), batch_ms=5)
+    room = [CountingSocket(fmt, batch) for _ in range(sockets)]
+    for ws in room:
+        await manager.connect(ws, 1)
+    cpu = 0.0
+    for i in range(0, len(messages), burst):
+        start = time.process_time()
+        for message in messages[i:i + burst]:
+            await manager.broadcast(message, 1)
+        await asyncio.sleep(0) # Senders drain their queues
+        cpu += time.process_time() - start
+        if batch:
+            await asyncio.sleep(0.006) # Let the batch timer fire
+            start = time.process_time()
+            await asyncio.sleep(0)
+            cpu += time.process_time() - start
+    for ws in room:
+        manager.disconnect(ws, 1)
+    return cpu, sum(ws.bytes for ws in room), sum(ws.frames for ws in room)
+
+
+def permessage_deflate(sockets: int, messages: list) -> tuple:
+    # RFC 7692 with context takeover, as negotiated by uvicorn: per-socket state
+    texts = [framing.json_text(message).encode() for message in messages]
+    start = time.process_time()
+    total = 0
+    for _ in range(sockets):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        for text in texts:
+            total += len(compressor.compress(text) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return time.process_time() - start, total, sockets * len(texts)
+
+
+async def main(sockets: int, n: int, burst: int):
+    messages = chat_messages(n)
+    delivered = sockets * n
+    print(f"{n} chat messages to {sockets} sockets, bursts of {burst}")
+    print(f"{'format':<34} {'bytes/msg':>10} {'frames':>8} {'CPU us/msg':>11}")
+    formats = [None] + [fmt for fmt in framing.FORMATS[1:] if framing.supported(fmt)]
+    rows = []
+    for batch in (False, True):
+        for fmt in formats:
+            label = (fmt or "json text (default)") + (" +batch" if batch else "")
+            rows.append((label, *await run(fmt, batch, sockets, messages, burst)))
+    rows.insert(len(formats), ("json text + permessage-deflate", *permessage_deflate(sockets, messages)))
+    for label, cpu, total, frames in rows:
+        print(f"{label:<34} {total / delivered:>10.1f} {frames:>8} {cpu * 1e6 / n:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.sockets, args.messages, args.burst))
@@ -0,0 +1,69 @@
+"""
+Order lifecycle engine with many in-flight orders.
+
+    python -m benchmarks.bench_lifecycle [--orders 50000] [--window 10]
+
+Seeds N pending orders whose timers expire evenly over `window` seconds, runs
+the engine until every order is cooking, and reports how late the transitions
+were, how many UPDATE batches it took and the engine's peak Python memory.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from benchmarks import common
+from apps import database, lifecycle, migrations, models
+
+
+def seed(n: int, start: float, window: float):
+    step = window / n
+    rows = [{
+        "item_name": "momo", "quantity": 1, "customer_id": 1, "status": "pending",
+        "next_transition_at": start + i * step,
+    } for i in range(n)]
+    with database.engine.begin() as conn:
+        conn.execute(models.OrderDB.__table__.insert(), rows)
+    return step
+
+
+async def main(n: int, window: float):
+    migrations.migrate()
+    start = time.time() + 1.0
+    step = seed(n, start, window)
+
+    engine = lifecycle.LifecycleEngine()
+    lateness, batches = [], 0
+    original = engine.advance_due
+
+    async def traced_advance(now=None):
+        nonlocal batches
+        changed = await original(now)
+        if changed:
+            batches += 1
+            t = time.time()
+            # Orders were seeded in id order, so due time follows from the id.
+            # Oldest and newest of each tick only: keeps this sampler out of the memory figure.
+            for order_id, *_ in (changed[0], changed[-1]):
+                lateness.append((t - (start + (order_id - 1) * step)) * 1000)
+        return changed
+
+    engine.advance_due = traced_advance
+    tracemalloc.start()
+    engine.start()
+    while engine.advanced < n:
+        await asyncio.sleep(0.1)
+    await engine.stop()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    common.report(f"transition lateness ({n} orders / {window}s)", lateness)
+    print(f"{'':<40} advanced={engine.advanced} ticks with work={batches} peak python memory={peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=50_000)
+    parser.add_argument("--window", type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders, args.window))
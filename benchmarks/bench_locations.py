@@ -0,0 +1,90 @@
+"""
+Location ingest: one upsert per GPS ping (write-through) vs. apps/locations.py
+(latest position in memory, jitter dropped, batched upserts).
+
+    python -m benchmarks.bench_locations [--couriers 500] [--pings 20]
+
+Every courier drives in a straight line and sends `pings` positions. Half of
+them are GPS noise around the previous fix, which is what a phone standing at a
+red light or in a kitchen sends.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks import common
+from apps.main import app
+from apps import database, locations, metrics, migrations, models
+from sqlalchemy.dialects.sqlite import insert
+
+
+def tracks(couriers: int, pings: int) -> list:
+    rng = random.Random(5)
+    now = time.time() - pings # Recorded in the past, like buffered pings
+    stream = []
+    for user_id in range(1, couriers + 1):
+        lat, lng = 27.7 + rng.uniform(-0.05, 0.05), 85.3 + rng.uniform(-0.05, 0.05)
+        for i in range(pings):
+            if i % 2:
+                lat, lng = lat + 0.0005, lng + 0.0005 # ~70m further
+            stream.append((user_id, lat + rng.gauss(0, 0.00002), lng + rng.gauss(0, 0.00002), now + i))
+    stream.sort(key=lambda ping: ping[3]) # Interleaved like real traffic
+    return stream
+
+
+async def write_through(stream) -> float:
+    stmt = insert(models.UserLocationDB)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.UserLocationDB.user_id],
+        set_={"latitude": stmt.excluded.latitude, "longitude": stmt.excluded.longitude},
+    )
+    start = time.perf_counter()
+    for user_id, lat, lng, _ in stream:
+        async with database.async_engine.begin() as conn:
+            await conn.execute(stmt, {"user_id": user_id, "latitude": lat, "longitude": lng})
+    return time.perf_counter() - start
+
+
+async def write_behind(stream) -> float:
+    store = locations.LocationStore(stream_seconds=3600) # Flushed by hand below
+    start = time.perf_counter()
+    for user_id, lat, lng, recorded_at in stream:
+        store.ingest(user_id, lat, lng, recorded_at)
+    await store.flush()
+    elapsed = time.perf_counter() - start
+    await store.stop()
+    return elapsed
+
+
+def queries() -> float:
+    return metrics.db_queries.values.get(("write",), 0.0)
+
+
+async def main(couriers: int, pings: int):
+    migrations.migrate()
+    stream = tracks(couriers, pings)
+    print(f"{len(stream)} pings from {couriers} couriers")
+    for label, run in (("write-through (upsert per ping)", write_through), ("write-behind (apps/locations.py)", write_behind)):
+        before = queries()
+        elapsed = await run(stream)
+        print(f"{label:<34} {elapsed * 1000:8.0f}ms {len(stream) / elapsed:>10.0f} pings/s {queries() - before:>7.0f} statements")
+
+    # End to end through the HTTP batch endpoint: one phone flushing 20 buffered pings per request
+    async with common.client(app) as c:
+        headers = await common.auth_headers(c, "bench_locations")
+        samples = []
+        mine = tracks(1, 400) # One phone, 20 requests of 20 buffered pings
+        for i in range(0, len(mine), 20):
+            body = {"pings": [{"latitude": lat, "longitude": lng, "recorded_at": t} for _, lat, lng, t in mine[i:i + 20]]}
+            samples.append(await common.timed(c.post("/locations/pings", json=body, headers=headers)))
+        common.report("POST /locations/pings (20 per batch)", samples)
+    await locations.store.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--couriers", type=int, default=500)
+    parser.add_argument("--pings", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.couriers, args.pings))
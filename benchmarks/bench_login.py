@@ -0,0 +1,70 @@
+"""
+Login throughput with bcrypt inline on the event loop vs. in the hashing pool.
+
+    python -m benchmarks.bench_login [--logins 64] [--workers 4]
+
+Reports logins/s, logins/s per core, the worst event-loop stall seen while the
+burst was running and how many requests were shed with 503.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks import common
+from apps.main import app
+from apps import auth
+
+USERS = 8
+
+
+async def loop_lag(stop, worst):
+    # A healthy loop wakes up every ~1ms; anything longer is time stolen by bcrypt
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst[0] = max(worst[0], (time.perf_counter() - start) * 1000 - 1)
+
+
+async def burst(c, logins):
+    async def one(i):
+        r = await c.post("/users/login", data={"username": f"bench_login_{i % USERS}", "password": "bench-pw"})
+        return r.status_code
+
+    start = time.perf_counter()
+    codes = await asyncio.gather(*(one(i) for i in range(logins)))
+    return time.perf_counter() - start, codes
+
+
+async def main(logins: int, workers: int, queue_limit: int):
+    async with common.client(app) as c:
+        for i in range(USERS):
+            await common.auth_headers(c, f"bench_login_{i}")
+
+        for kind in ("inline", "thread", "process"):
+            auth.configure_hash_pool(kind, workers, queue_limit)
+            cores = 1 if kind == "inline" else min(workers, os.cpu_count() or 1)
+
+            stop, worst = asyncio.Event(), [0.0]
+            lag = asyncio.create_task(loop_lag(stop, worst))
+            elapsed, codes = await burst(c, logins)
+            stop.set()
+            await lag
+
+            ok = codes.count(200)
+            print(
+                f"{kind:<8} workers={workers if kind != 'inline' else 0:<3} "
+                f"ok={ok:<4} shed={codes.count(503):<4} "
+                f"logins/s={ok / elapsed:7.1f} per-core={ok / elapsed / cores:7.1f} "
+                f"max-loop-stall={worst[0]:8.1f}ms"
+            )
+        auth.configure_hash_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--queue-limit", type=int, default=auth.HASH_QUEUE_LIMIT)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.workers, args.queue_limit))
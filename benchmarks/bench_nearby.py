@@ -0,0 +1,62 @@
+"""
+GET /restaurants/nearby latency with a large seeded catalogue.
+
+    python -m benchmarks.bench_nearby [--restaurants 100000] [--requests 300]
+
+Restaurants are scattered around a handful of city centres so the R*Tree has
+realistic dense and sparse regions.
+"""
+import argparse
+import asyncio
+import random
+
+from benchmarks import common
+from apps.main import app
+from apps import database, migrations, models
+
+CITIES = [(27.7172, 85.3240), (28.2096, 83.9856), (26.4525, 87.2718), (27.6710, 85.4298), (28.6980, 80.5936)]
+
+
+def seed(n: int):
+    rng = random.Random(7)
+    rows = []
+    for i in range(n):
+        lat, lng = rng.choice(CITIES)
+        rows.append({
+            "name": f"Bench Kitchen {i}",
+            "cuisine_type": rng.choice(["nepali", "indian", "thai", "pizza", "burger"]),
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "is_open": rng.random() < 0.8,
+            "latitude": lat + rng.gauss(0, 0.08),
+            "longitude": lng + rng.gauss(0, 0.08),
+            "owner_id": 1,
+        })
+    with database.engine.begin() as conn:
+        conn.execute(models.RestaurantDB.__table__.insert(), rows)
+
+
+async def main(restaurants: int, requests: int, radius_km: float):
+    migrations.migrate()
+    seed(restaurants)
+    rng = random.Random(11)
+    async with common.client(app) as c:
+        headers = await common.auth_headers(c, "bench_nearby")
+        samples, found = [], 0
+        for _ in range(requests):
+            lat, lng = rng.choice(CITIES)
+            params = {"latitude": lat + rng.gauss(0, 0.05), "longitude": lng + rng.gauss(0, 0.05), "radius_km": radius_km}
+            ms = await common.timed(c.get("/restaurants/nearby", params=params, headers=headers))
+            samples.append(ms)
+        r = await c.get("/restaurants/nearby", params=params, headers=headers)
+        found = len(r.json())
+        common.report(f"GET /restaurants/nearby ({restaurants} rows, {radius_km}km)", samples)
+        print(f"{'':<40} last page size={found}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--restaurants", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--radius-km", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.restaurants, args.requests, args.radius_km))
@@ -0,0 +1,42 @@
+"""
+Per-request SQL queries and latency for authenticated calls, with the
+principal cache disabled vs enabled.
+
+    python -m benchmarks.bench_principal_cache [--requests 500]
+"""
+import argparse
+import asyncio
+
+from benchmarks import common
+from apps.main import app
+from apps import auth, database
+
+
+async def run(c, headers, order_id, n, counter):
+    counter.reset()
+    samples = []
+    for i in range(n):
+        path = "/users/me" if i % 2 else f"/orders/{order_id}"
+        samples.append(await common.timed(c.get(path, headers=headers)))
+    return samples, counter.count / n
+
+
+async def main(n: int):
+    # GETs read through the read-only pool: count both engines
+    counter = common.QueryCounter(database.async_engine, database.read_engine)
+    async with common.client(app) as c:
+        headers = await common.auth_headers(c, "bench_principal")
+        order_id = await common.place_order(c, headers)
+
+        for label, size in (("cache off", 0), ("cache on", auth.PRINCIPAL_CACHE_SIZE or 10000)):
+            auth.principal_cache = auth.PrincipalCache(size, auth.PRINCIPAL_CACHE_TTL_SECONDS)
+            samples, per_request = await run(c, headers, order_id, n, counter)
+            common.report(f"{label}: /users/me + /orders/{{id}}", samples)
+            print(f"{'':<40} queries/request={per_request:.2f} hits={auth.principal_cache.hits}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
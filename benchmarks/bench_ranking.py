@@ -0,0 +1,88 @@
+"""
+Home feed ranking with a large catalogue: the NumPy snapshot (apps/ranking.py)
+vs. scoring the same rows one by one in Python, then GET /restaurants/feed end to end.
+
+    python -m benchmarks.bench_ranking [--restaurants 100000] [--requests 300]
+
+Restaurants come from bench_nearby's generator (dense city centres, 80% open).
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks import common, bench_nearby
+from apps.main import app
+from apps import database, geo, migrations, ranking
+from sqlalchemy import select
+
+
+def python_rank(rows, latitude: float, longitude: float, radius_km: float, limit: int) -> list:
+    # The per-request loop the snapshot replaces: same score, one row at a time
+    scored = []
+    max_eta = ranking.eta_minutes(radius_km) - ranking.FEED_PREP_MINUTES
+    for r in rows:
+        if not r.is_open or r.latitude is None:
+            continue
+        d = geo.haversine_km(latitude, longitude, r.latitude, r.longitude)
+        if d > radius_km:
+            continue
+        eta = ranking.eta_minutes(d)
+        score = (ranking.FEED_WEIGHT_ETA * (1 - (eta - ranking.FEED_PREP_MINUTES) / max_eta)
+                 + ranking.FEED_WEIGHT_RATING * min(1.0, (r.rating or 0.0) / ranking.MAX_RATING))
+        scored.append((-score, d, r.id))
+    scored.sort()
+    return [restaurant_id for _, _, restaurant_id in scored[:limit]]
+
+
+def locations(n: int) -> list:
+    rng = random.Random(11)
+    return [
+        (lat + rng.gauss(0, 0.05), lng + rng.gauss(0, 0.05))
+        for lat, lng in (rng.choice(bench_nearby.CITIES) for _ in range(n))
+    ]
+
+
+def timed_ms(fn, points) -> list:
+    samples = []
+    for lat, lng in points:
+        start = time.perf_counter()
+        fn(lat, lng)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main(restaurants: int, requests: int, radius_km: float, limit: int):
+    migrations.migrate()
+    bench_nearby.seed(restaurants)
+    start = time.perf_counter()
+    await ranking.snapshot.sync()
+    print(f"snapshot load: {len(ranking.snapshot)} restaurants in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    async with database.ReadSessionLocal() as db:
+        rows = (await db.execute(select(*ranking.COLUMNS))).all()
+    points = locations(requests)
+
+    lat, lng = points[0] # Same winners either way
+    assert [r[0][0] for r in ranking.snapshot.rank(lat, lng, radius_km, limit)] == python_rank(rows, lat, lng, radius_km, limit)
+
+    common.report(f"python loop ({restaurants} rows)", timed_ms(lambda a, b: python_rank(rows, a, b, radius_km, limit), points[:30]))
+    common.report(f"numpy snapshot ({restaurants} rows)", timed_ms(lambda a, b: ranking.snapshot.rank(a, b, radius_km, limit), points))
+
+    async with common.client(app) as c:
+        headers = await common.auth_headers(c, "bench_ranking")
+        samples = []
+        for lat, lng in points:
+            params = {"latitude": lat, "longitude": lng, "radius_km": radius_km, "limit": limit}
+            samples.append(await common.timed(c.get("/restaurants/feed", params=params, headers=headers)))
+        common.report(f"GET /restaurants/feed ({radius_km}km, top {limit})", samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--restaurants", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--radius-km", type=float, default=10.0)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.restaurants, args.requests, args.radius_km, args.limit))
@@ -0,0 +1,77 @@
+"""
+/search (FTS5) latency vs. a LIKE '%...%' scan as the catalogue grows.
+
+    python -m benchmarks.bench_search [--steps 10000,100000,300000] [--requests 100]
+"""
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import text
+
+from benchmarks import common
+from apps.main import app
+from apps import database, fulltext, models
+from apps.routers import search
+
+WORDS = ["chicken", "buff", "veg", "paneer", "momo", "chowmein", "thukpa", "pizza", "burger",
+         "tikka", "masala", "fried", "steamed", "spicy", "cheese", "rice", "noodle", "soup", "curry", "naan"]
+QUERIES = ["chicken momo", "paneer", "spicy noodle", "chees", "thukpa soup"]
+
+# Same contract as /search: best matches first (name hits before description hits)
+LIKE_SQL = text("""
+    SELECT id FROM menu_items
+    WHERE name LIKE :pattern OR description LIKE :pattern
+    ORDER BY (name LIKE :pattern) DESC, id
+    LIMIT 20
+""")
+
+
+def _word(rng: random.Random) -> str:
+    # ~2% real dish words, the rest a long tail of filler vocabulary
+    if rng.random() < 0.02:
+        return rng.choice(WORDS)
+    return f"{rng.choice('bcdfghklmnprstvz')}{rng.choice('aeiou')}{rng.randint(0, 9999)}"
+
+
+def seed(n: int, rng: random.Random):
+    rows = [{
+        "name": " ".join(_word(rng) for _ in range(2)).title(),
+        "description": " ".join(_word(rng) for _ in range(6)),
+        "price": round(rng.uniform(2, 30), 2),
+        "restaurant_id": rng.randint(1, 1000),
+    } for _ in range(n)]
+    with database.engine.begin() as conn:
+        conn.execute(models.MenuItemDB.__table__.insert(), rows)
+
+
+async def main(steps, requests: int):
+    rng = random.Random(3)
+    seeded = 0
+    async with common.client(app) as c:
+        for target in steps:
+            seed(target - seeded, rng)
+            seeded = target
+
+            endpoint = []
+            for i in range(requests):
+                endpoint.append(await common.timed(c.get("/search", params={"q": QUERIES[i % len(QUERIES)], "scope": "dishes"})))
+            common.report(f"GET /search          ({seeded} dishes)", endpoint)
+
+            fts, like = [], []
+            async with database.AsyncSessionLocal() as db:
+                for i in range(requests):
+                    q = QUERIES[i % len(QUERIES)]
+                    params = {"match": fulltext.to_match_query(q), "limit": 20, "offset": 0}
+                    fts.append(await common.timed(db.execute(search.DISH_SEARCH_SQL, params)))
+                    like.append(await common.timed(db.execute(LIKE_SQL, {"pattern": f"%{q.split()[-1]}%"})))
+            common.report(f"  FTS5 query only     ({seeded} dishes)", fts)
+            common.report(f"  LIKE '%...%' scan   ({seeded} dishes)", like)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", default="10000,100000,300000")
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main([int(s) for s in args.steps.split(",")], args.requests))
@@ -0,0 +1,98 @@
+"""
+CPU per 1,000-row list response: FastAPI's response_model path (validate every
+row into the schema, then dump) vs. apps/serialize.py (rows -> dicts -> orjson).
+
+    python -m benchmarks.bench_serialize [--rows 1000] [--repeat 200]
+
+Only serialization is timed (process CPU time); the rows are loaded once with
+the same queries the endpoints run.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks import common, seed
+from apps.main import app
+from apps import database, models, serialize, schemas
+from apps.routers import chat, orders, restaurants
+from fastapi.routing import serialize_response
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+
+def route_field(path: str):
+    routes = restaurants.router.routes + orders.router.routes + chat.router.routes
+    return next(r for r in routes if r.path == path and "GET" in getattr(r, "methods", ())).response_field
+
+
+def cpu_ms(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def response_model_path(field, data) -> bytes:
+    # What FastAPI does for a route that returns rows: validate them into the
+    # response_model (from_attributes), then dump in pydantic-core. It never
+    # awaits anything for async routes, so drive the coroutine by hand.
+    coro = serialize_response(field=field, response_content=data, dump_json=True)
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("serialize_response suspended")
+
+
+async def load(rows: int):
+    seed.generate(users=50, restaurants=50, menu_items=rows, orders=rows, log=lambda line: None)
+    with database.engine.begin() as conn:
+        conn.execute(models.ChatMessageDB.__table__.insert(), [
+            {"order_id": 1, "sender_type": "user", "message": f"where is my momo? #{i}", "timestamp": "2026-01-01T12:00:00"}
+            for i in range(rows)
+        ])
+    async with database.ReadSessionLocal() as db:
+        menu = (await db.execute(
+            select(models.MenuItemDB.id, models.MenuItemDB.name, models.MenuItemDB.description, models.MenuItemDB.price,
+                   models.RestaurantDB.name.label("restaurant_name"))
+            .outerjoin(models.RestaurantDB, models.MenuItemDB.restaurant_id == models.RestaurantDB.id)
+            .limit(rows)
+        )).freeze() # Replayable: every call gives a fresh Result
+        order_objs = (await db.scalars(
+            select(models.OrderDB).options(selectinload(models.OrderDB.lines)).limit(rows)
+        )).all()
+        messages = (await db.execute(chat._messages_after(1, 0, rows))).freeze()
+    return menu, order_objs, messages
+
+
+async def main(rows: int, repeat: int):
+    async with common.client(app):
+        pass # Migrates the scratch database
+    menu, order_objs, messages = await load(rows)
+
+    cases = [
+        # (label, rows, route path, fast path)
+        ("menu feed", menu().all(), "/restaurants/menu/all",
+         lambda: serialize.dumps(serialize.rows(menu(), schemas.MenuItemResponse))),
+        ("order history (+lines)", order_objs, "/orders/history",
+         lambda: serialize.dumps([orders._order_record(o) for o in order_objs])),
+        ("chat history", messages().all(), "/chat/{order_id}/history",
+         lambda: serialize.dumps(serialize.rows(messages(), schemas.ChatMessageResponse))),
+    ]
+    print(f"CPU ms per {rows}-row response ({'orjson' if serialize.orjson else 'stdlib json'})")
+    print(f"{'':<24} {'response_model':>15} {'fast path':>10} {'speedup':>8}")
+    for label, data, path, fast in cases:
+        field = route_field(path)
+        assert json.loads(fast()) == json.loads(response_model_path(field, data)) # Same output either way
+        before = cpu_ms(lambda: response_model_path(field, data), repeat)
+        after = cpu_ms(fast, repeat)
+        print(f"{label:<24} {before:>13.2f}ms {after:>8.2f}ms {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
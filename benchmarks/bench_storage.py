@@ -0,0 +1,125 @@
+"""
+Mixed read/write throughput for each storage profile (apps/database.py).
+
+Every profile runs in a fresh child process on its own scratch database:
+readers page through GET /restaurants/menu/all (catalog cache disabled, so
+each read hits SQLite) and GET /orders/{id}, while writers place orders and
+send chat messages for a fixed number of seconds.
+
+    python -m benchmarks.bench_storage [--seconds 5] [--readers 16] [--writers 4]
+    python -m benchmarks.bench_storage --profiles legacy wal
+
+All of it runs on one event loop, which is often the real bottleneck here; the
+profiles differ most in write throughput (commit cost) and in how long requests
+wait on SQLite's lock ("legacy" readers and writers lock the whole file).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = ("legacy", "wal", "durable", "fast")
+
+
+async def child(seconds: float, readers: int, writers: int, items: int):
+    from benchmarks import common
+    from apps import database
+    from apps.main import app
+
+    async with common.client(app) as c:
+        owner = await common.auth_headers(c, "bench_owner", role="restaurant")
+        r = await c.post("/restaurants/", json={
+            "name": "Bench Kitchen", "cuisine_type": "nepali", "latitude": 27.7, "longitude": 85.3,
+        }, headers=owner)
+        restaurant_id = r.json()["id"]
+        for i in range(items):
+            await c.post(f"/restaurants/{restaurant_id}/menu", json={
+                "name": f"dish {i}", "description": "bench", "price": 100 + i,
+            }, headers=owner)
+
+        headers = await common.auth_headers(c, "bench_customer")
+        order_id = await common.place_order(c, headers)
+
+        stop = asyncio.Event()
+        reads, writes = [], []
+
+        async def read_loop():
+            while not stop.is_set():
+                if random.random() < 0.5:
+                    after_id = random.randint(0, max(0, items - 50))
+                    call = c.get(f"/restaurants/menu/all?after_id={after_id}&limit=50")
+                else:
+                    call = c.get(f"/orders/{order_id}", headers=headers)
+                reads.append(await common.timed(call))
+
+        async def write_loop(n):
+            while not stop.is_set():
+                if n % 2:
+                    call = c.post(f"/chat/{order_id}/user/send", json={"message": "on my way?"}, headers=headers)
+                else:
+                    call = c.post("/orders/place", json={"item_name": "momo", "quantity": 1}, headers=headers)
+                writes.append(await common.timed(call))
+
+        tasks = [asyncio.create_task(read_loop()) for _ in range(readers)]
+        tasks += [asyncio.create_task(write_loop(n)) for n in range(writers)]
+        start = time.perf_counter()
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "profile": database.STORAGE_PROFILE,
+        "reads_per_s": len(reads) / elapsed,
+        "writes_per_s": len(writes) / elapsed,
+        "read_p95": common.percentile(reads, 95),
+        "read_p99": common.percentile(reads, 99),
+        "write_p95": common.percentile(writes, 95),
+    }))
+
+
+def run_profile(profile: str, args) -> dict:
+    env = dict(
+        os.environ,
+        URBANPLATE_STORAGE_PROFILE=profile,
+        URBANPLATE_DB_PATH=os.path.join(tempfile.mkdtemp(prefix=f"urbanplate-{profile}-"), "bench.db"),
+        URBANPLATE_CATALOG_CACHE_SIZE="0", # Measure SQLite, not the response cache
+    )
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_storage", "--child",
+         "--seconds", str(args.seconds), "--readers", str(args.readers),
+         "--writers", str(args.writers), "--items", str(args.items)],
+        env=env, check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(args):
+    print(f"{args.readers} readers + {args.writers} writers, {args.seconds}s per profile")
+    print(f"{'profile':<10} {'reads/s':>9} {'writes/s':>9} {'read p95':>10} {'read p99':>10} {'write p95':>10}")
+    for profile in args.profiles:
+        r = run_profile(profile, args)
+        print(
+            f"{r['profile']:<10} {r['reads_per_s']:9.0f} {r['writes_per_s']:9.0f} "
+            f"{r['read_p95']:8.2f}ms {r['read_p99']:8.2f}ms {r['write_p95']:8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=PROFILES)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child(args.seconds, args.readers, args.writers, args.items))
+    else:
+        main(args)
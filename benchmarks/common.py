@@ -0,0 +1,138 @@
+"""
+Shared helpers for the in-process benchmarks.
+
+Import this module BEFORE anything from `apps`, it points the app at a
+scratch SQLite file so benchmarks never touch ./urbanplate.db, and turns the
+per-user rate limits off.
+"""
+import asyncio
+import os
+import tempfile
+import time
+from urllib.parse import urlencode
+
+os.environ.setdefault(
+    "URBANPLATE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="urbanplate-bench-"), "bench.db")
+)
+# Benchmarks hammer the write routes from a handful of users on purpose
+os.environ.setdefault("URBANPLATE_RATE_LIMITS", "off")
+
+import httpx
+
+
+def client(app, migrate: bool = True):
+    # ASGI transport: requests go straight into the app, no sockets involved.
+    # It does not run the lifespan hook, so bring the schema up to date here.
+    # Pass migrate=False inside app.router.lifespan_context(): the lifespan has
+    # migrated already, and this blocking call would then race its background writers.
+    if migrate:
+        from apps import migrations
+
+        migrations.migrate()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+class ASGIWebSocket:
+    """
+    In-process WebSocket client: drives the app's ASGI callable directly, the
+    way httpx.ASGITransport does for HTTP (which has no WebSocket support).
+
+        async with common.ASGIWebSocket(app, "/chat/ws/1/user", token=...) as ws:
+            await ws.send_text("hi")
+            frame = await ws.receive_text()
+    """
+
+    def __init__(self, app, path: str, **params):
+        self.app = app
+        self.scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws",
+            "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": urlencode(params).encode(),
+            "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+            "subprotocols": [],
+        }
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self.app(self.scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            await self._stop()
+            raise ConnectionRefusedError(f"WebSocket rejected: {message}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        await self._stop()
+
+    async def _stop(self):
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+
+    async def send_text(self, text: str):
+        await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def receive_text(self) -> str:
+        message = await self._from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError(f"WebSocket closed: {message.get('code')}")
+        return message.get("text") or message["bytes"].decode()
+
+
+async def auth_headers(c, username: str, password: str = "bench-pw", role: str = "customer"):
+    await c.post("/users/register", json={
+        "username": username, "email": f"{username}@bench.local",
+        "password": password, "role": role,
+    })
+    r = await c.post("/users/login", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+async def place_order(c, headers, item_name: str = "momo", quantity: int = 1) -> int:
+    r = await c.post("/orders/place", json={"item_name": item_name, "quantity": quantity, "customer_id": 0}, headers=headers)
+    return r.json()["id"]
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def report(label: str, samples_ms):
+    print(
+        f"{label:<40} n={len(samples_ms):<6} "
+        f"p50={percentile(samples_ms, 50):7.2f}ms "
+        f"p95={percentile(samples_ms, 95):7.2f}ms "
+        f"p99={percentile(samples_ms, 99):7.2f}ms"
+    )
+
+
+class QueryCounter:
+    """Counts SQL statements issued through the given engines while active."""
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in engines:
+            event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
@@ -0,0 +1,320 @@
+"""
+In-process load test: drives apps.main:app through ASGI (no sockets, no server)
+and reports throughput and p50/p95/p99 per route.
+
+    python -m benchmarks.loadtest                          # scratch db, --scale tiny
+    python -m benchmarks.loadtest --scale small
+    python -m benchmarks.loadtest --db /tmp/urbanplate-large.db   # seeded by benchmarks.seed
+    python -m benchmarks.loadtest --save baseline.json     # keep these numbers
+    python -m benchmarks.loadtest --compare baseline.json  # exit 1 on regressions
+
+Every scenario sends --requests requests (bcrypt-bound auth routes a quarter of
+that) from --concurrency tasks. Scenarios run one after another, so each route is
+measured on its own. Compare runs of the same dataset and flags only, and use
+a few thousand requests when the comparison matters: short runs are noisy.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# --- SCENARIOS ---
+# Each returns the HTTP response (or None for WebSocket round-trips) of ONE request.
+async def register(ctx, rng, n):
+    return await ctx.c.post("/users/register", json={
+        "username": f"lt_{ctx.run_id}_{n}", "email": f"lt_{ctx.run_id}_{n}@bench.local", "password": "lt-pw",
+    })
+
+
+async def login(ctx, rng, n):
+    user = rng.randint(1, ctx.sizes["users"])
+    return await ctx.c.post("/users/login", data={"username": f"seed_user_{user}", "password": ctx.seed_password})
+
+
+async def menu_feed(ctx, rng, n):
+    after_id = rng.randint(0, max(0, ctx.sizes["menu_items"] - 50))
+    return await ctx.c.get("/restaurants/menu/all", params={"after_id": after_id, "limit": 50})
+
+
+async def restaurant_list(ctx, rng, n):
+    return await ctx.c.get("/restaurants", params={
+        "cuisine": rng.choice(ctx.cuisines), "is_open": True, "min_rating": 3.5, "fields": "summary",
+    })
+
+
+async def nearby(ctx, rng, n):
+    lat, lng = rng.choice(ctx.cities)
+    return await ctx.c.get("/restaurants/nearby", params={
+        "latitude": lat + rng.gauss(0, 0.05), "longitude": lng + rng.gauss(0, 0.05), "radius_km": 3, "k": 20,
+    }, headers=rng.choice(ctx.headers))
+
+
+async def search(ctx, rng, n):
+    q = f"{rng.choice(ctx.styles)} {rng.choice(ctx.dishes)}" if rng.random() < 0.5 else rng.choice(ctx.dishes)
+    return await ctx.c.get("/search", params={"q": q, "limit": 20})
+
+
+async def place_order(ctx, rng, n):
+    menu = rng.choice(ctx.menus) # An order comes from one restaurant
+    items = [{"menu_item_id": rng.choice(menu), "quantity": rng.randint(1, 2)} for _ in range(rng.randint(1, 3))]
+    return await ctx.c.post("/orders/place", json={"items": items}, headers=rng.choice(ctx.headers))
+
+
+async def get_order(ctx, rng, n):
+    headers, order_id = rng.choice(ctx.own_orders)
+    return await ctx.c.get(f"/orders/{order_id}", headers=headers)
+
+
+async def order_history(ctx, rng, n):
+    return await ctx.c.get("/orders/history", params={"limit": 20}, headers=rng.choice(ctx.headers))
+
+
+async def kitchen_queue(ctx, rng, n):
+    headers, restaurant_id = rng.choice(ctx.kitchens)
+    return await ctx.c.get(f"/orders/restaurant/{restaurant_id}/queue", headers=headers)
+
+
+async def update_status(ctx, rng, n):
+    # Each request cancels a different freshly placed order (pending -> cancelled)
+    headers, order_id = ctx.cancellable.pop()
+    return await ctx.c.patch(f"/orders/{order_id}/status", params={"status": "cancelled"}, headers=headers)
+
+
+async def chat_round_trip(ctx, rng, n):
+    # Send on one socket, done when the same socket sees its message come back
+    ws, lock = ctx.sockets[n % len(ctx.sockets)]
+    async with lock:
+        text = f"lt-{n}"
+        await ws.send_text(text)
+        while True:
+            frame = json.loads(await ws.receive_text())
+            if frame.get("message") == text:
+                return
+            if frame.get("event") in ("rate_limited", "busy"): # Dropped, it will never come back
+                raise RuntimeError(frame["event"])
+
+
+SCENARIOS = [
+    # (route label, scenario, share of --requests)
+    ("POST /users/register", register, 0.25),
+    ("POST /users/login", login, 0.25),
+    ("GET /restaurants/menu/all", menu_feed, 1),
+    ("GET /restaurants summary", restaurant_list, 1),
+    ("GET /restaurants/nearby", nearby, 1),
+    ("GET /search", search, 1),
+    ("POST /orders/place", place_order, 1),
+    ("GET /orders/{id}", get_order, 1),
+    ("GET /orders/history", order_history, 1),
+    ("GET kitchen queue", kitchen_queue, 1),
+    ("PATCH /orders/{id}/status", update_status, 1),
+    ("WS /chat/ws round-trip", chat_round_trip, 1),
+]
+
+
+# --- RUNNER ---
+class Context:
+    pass
+
+
+async def run_scenario(ctx, fn, requests: int, concurrency: int, rng_seed: int):
+    samples, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker(w):
+        nonlocal errors
+        rng = random.Random(rng_seed * 1000 + w)
+        for n in counter:
+            start = time.perf_counter()
+            try:
+                r = await fn(ctx, rng, n)
+                ok = r is None or r.status_code < 400
+            except Exception:
+                ok = False
+            samples.append((time.perf_counter() - start) * 1000)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return samples, errors, time.perf_counter() - started
+
+
+async def setup(ctx, app, args):
+    from sqlalchemy import select
+    from benchmarks import common, seed
+    from apps import database, models
+
+    rng = random.Random(1)
+    ctx.run_id = f"{os.getpid()}{int(time.time())}"
+    ctx.seed_password = seed.SEED_PASSWORD
+    ctx.cities, ctx.dishes, ctx.styles, ctx.cuisines = seed.CITIES, seed.DISHES, seed.STYLES, seed.CUISINES
+
+    # A pool of logged-in customers (seeded users, bcrypt paid once here)
+    ctx.headers = []
+    for i in range(args.users_pool):
+        r = await ctx.c.post("/users/login", data={"username": f"seed_user_{i + 1}", "password": ctx.seed_password})
+        ctx.headers.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+
+    # Menus of a slice of restaurants (carts are single-restaurant) and a few
+    # owners with their restaurant, for the kitchen routes
+    async with database.ReadSessionLocal() as db:
+        menus = {}
+        for row in await db.execute(
+            select(models.MenuItemDB.restaurant_id, models.MenuItemDB.id)
+            .filter(models.MenuItemDB.restaurant_id <= 200)
+        ):
+            menus.setdefault(row.restaurant_id, []).append(row.id)
+        ctx.menus = list(menus.values())
+        owned = (await db.execute(
+            select(models.UserDB.username, models.RestaurantDB.id)
+            .join(models.RestaurantDB, models.RestaurantDB.owner_id == models.UserDB.id)
+            .filter(models.UserDB.username.like("seed_owner_%"))
+            .order_by(models.RestaurantDB.id)
+            .limit(5)
+        )).all()
+    ctx.kitchens = []
+    for username, restaurant_id in owned:
+        r = await ctx.c.post("/users/login", data={"username": username, "password": ctx.seed_password})
+        ctx.kitchens.append(({"Authorization": f"Bearer {r.json()['access_token']}"}, restaurant_id))
+
+    async def place(headers):
+        r = await ctx.c.post("/orders/place", json={"items": [{"menu_item_id": rng.randint(1, ctx.sizes["menu_items"])}]}, headers=headers)
+        return headers, r.json()["id"]
+
+    ctx.own_orders = [await place(h) for h in ctx.headers]
+    ctx.cancellable = [await place(rng.choice(ctx.headers)) for _ in range(args.requests)]
+
+    # Chat rooms: --sockets sockets spread over rooms of 5 (each one the order owner's)
+    ctx.sockets, ctx._socket_cms = [], []
+    for i in range(args.sockets):
+        headers, order_id = ctx.own_orders[(i // 5) % len(ctx.own_orders)]
+        token = headers["Authorization"].split()[1]
+        cm = common.ASGIWebSocket(app, f"/chat/ws/{order_id}/user", token=token)
+        ctx.sockets.append((await cm.__aenter__(), asyncio.Lock()))
+        ctx._socket_cms.append(cm)
+
+
+async def teardown(ctx):
+    for cm in ctx._socket_cms:
+        await cm.__aexit__(None, None, None)
+
+
+async def run(args, sizes):
+    from benchmarks import common
+    from apps.main import app
+
+    results = {}
+    ctx = Context()
+    ctx.sizes = sizes
+    async with app.router.lifespan_context(app), common.client(app, migrate=False) as c:
+        ctx.c = c
+        await setup(ctx, app, args)
+        print(f"{'route':<30} {'n':>6} {'err':>5} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for i, (label, fn, share) in enumerate(SCENARIOS):
+            if args.only and not any(word in label for word in args.only):
+                continue
+            n = max(1, int(args.requests * share))
+            samples, errors, elapsed = await run_scenario(ctx, fn, n, args.concurrency, rng_seed=i)
+            results[label] = {
+                "n": len(samples),
+                "errors": errors,
+                "rps": round(len(samples) / elapsed, 1),
+                "p50": round(common.percentile(samples, 50), 2),
+                "p95": round(common.percentile(samples, 95), 2),
+                "p99": round(common.percentile(samples, 99), 2),
+            }
+            r = results[label]
+            print(f"{label:<30} {r['n']:>6} {r['errors']:>5} {r['rps']:>8.1f} "
+                  f"{r['p50']:>7.2f}ms {r['p95']:>7.2f}ms {r['p99']:>7.2f}ms")
+        await teardown(ctx)
+    return results
+
+
+# --- BASELINES ---
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """Print deltas against a saved run. Returns the number of regressed routes."""
+    meta = baseline.get("meta", {})
+    print(f"\nvs baseline {meta.get('commit', '?')} ({meta.get('dataset', '?')}), threshold {threshold:.0%}")
+    regressions = 0
+    for label, r in results.items():
+        base = baseline["routes"].get(label)
+        if base is None:
+            print(f"{label:<30} new route")
+            continue
+        p95 = (r["p95"] - base["p95"]) / base["p95"] if base["p95"] else 0.0
+        rps = (r["rps"] - base["rps"]) / base["rps"] if base["rps"] else 0.0
+        bad = p95 > threshold or rps < -threshold or r["errors"] > base["errors"]
+        regressions += bad
+        print(f"{label:<30} p95 {p95:+7.1%}  req/s {rps:+7.1%}  {'REGRESSION' if bad else 'ok'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="pre-seeded database (python -m benchmarks.seed); default: seed a scratch one")
+    parser.add_argument("--scale", default="tiny", help="dataset for the scratch database (see benchmarks.seed)")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users-pool", type=int, default=20, help="logged-in customers sending the requests")
+    parser.add_argument("--sockets", type=int, default=50, help="chat WebSockets (5 per order)")
+    parser.add_argument("--only", nargs="*", help="run routes whose label contains any of these words")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95 / throughput change")
+    args = parser.parse_args()
+
+    # The database must be chosen before anything from `apps` is imported
+    if args.db:
+        os.environ["URBANPLATE_DB_PATH"] = args.db
+    else:
+        os.environ["URBANPLATE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="urbanplate-loadtest-"), "load.db")
+    # Measure the routes, not the per-user limits (load shedding stays on)
+    os.environ.setdefault("URBANPLATE_RATE_LIMITS", "off")
+    from benchmarks import seed
+    from sqlalchemy import func, select
+    from apps import database, models
+
+    if args.db:
+        with database.engine.connect() as conn:
+            count = lambda model: conn.scalar(select(func.count()).select_from(model))
+            sizes = {"users": conn.scalar(select(func.count()).select_from(models.UserDB).filter(
+                models.UserDB.username.like("seed_user_%"))), "menu_items": count(models.MenuItemDB)}
+        dataset = f"{os.path.basename(args.db)}: {sizes['users']} users, {sizes['menu_items']} menu items"
+    else:
+        print(f"Seeding scratch database ({args.scale})...")
+        sizes = seed.generate(**seed.SCALES[args.scale], log=lambda line: None)
+        dataset = f"scale {args.scale}"
+
+    results = asyncio.run(run(args, sizes))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(), "dataset": dataset, "requests": args.requests,
+                    "concurrency": args.concurrency, "python": platform.python_version(),
+                },
+                "routes": results,
+            }, f, indent=2)
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Bulk synthetic dataset for load tests.
+
+    python -m benchmarks.seed --scale large --db /tmp/urbanplate-large.db
+    python -m benchmarks.seed --users 5000 --restaurants 500 --menu-items 50000
+
+Scales (users / restaurants / menu items / orders):
+    tiny    1k / 200 / 10k / 5k
+    small   10k / 2k / 100k / 50k
+    large   100k / 20k / 1M / 500k
+
+The generator is deterministic (fixed RNG seed), so the same scale always yields
+the same database and load-test results stay comparable across commits.
+Every seeded user logs in with SEED_PASSWORD: customers are seed_user_<n>,
+restaurant owners seed_owner_<n>.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+SCALES = {
+    "tiny": {"users": 1_000, "restaurants": 200, "menu_items": 10_000, "orders": 5_000},
+    "small": {"users": 10_000, "restaurants": 2_000, "menu_items": 100_000, "orders": 50_000},
+    "large": {"users": 100_000, "restaurants": 20_000, "menu_items": 1_000_000, "orders": 500_000},
+}
+
+SEED_PASSWORD = "seed-pw"
+BATCH = 20_000
+
+CITIES = [(27.7172, 85.3240), (28.2096, 83.9856), (26.4525, 87.2718), (27.6710, 85.4298), (28.6980, 80.5936)]
+CUISINES = ["nepali", "indian", "thai", "chinese", "pizza", "burger", "tibetan", "korean", "cafe", "bakery"]
+DISHES = ["momo", "chowmein", "thukpa", "pizza", "burger", "tikka", "masala", "curry", "naan", "biryani",
+          "sekuwa", "sel roti", "dal bhat", "samosa", "pad thai", "ramen", "dumpling", "wrap", "salad", "soup"]
+STYLES = ["chicken", "buff", "veg", "paneer", "mutton", "pork", "fish", "egg", "mushroom", "cheese",
+          "spicy", "steamed", "fried", "jhol", "kothey", "tandoori", "garlic", "smoked", "crispy", "house"]
+# Long tail so full-text search sees realistic term frequencies
+FILLER = [f"{c}{v}{n}" for c in "bcdfghklmnprstvz" for v in "aeiou" for n in range(60)]
+
+
+def _dish(rng: random.Random) -> str:
+    return f"{rng.choice(STYLES)} {rng.choice(DISHES)}".title()
+
+
+def _insert(conn, table, rows):
+    for start in range(0, len(rows), BATCH):
+        conn.execute(table.insert(), rows[start:start + BATCH])
+
+
+def generate(users: int, restaurants: int, menu_items: int, orders: int, seed: int = 42, log=print) -> dict:
+    """Seed the database at URBANPLATE_DB_PATH (schema is migrated first). Returns the counts."""
+    from sqlalchemy import select
+    from apps import auth, database, lifecycle, migrations, models
+
+    migrations.migrate()
+    rng = random.Random(seed)
+    password_hash = auth.get_password_hash(SEED_PASSWORD) # One bcrypt for everybody
+    owners = max(1, restaurants // 2)
+    started = time.perf_counter()
+
+    with database.engine.begin() as conn:
+        if conn.execute(select(models.UserDB.id).limit(1)).first():
+            raise SystemExit(f"{database.DB_PATH} already has users, seed into an empty database")
+
+        # Customers first (ids 1..users), then owners (users+1..users+owners)
+        _insert(conn, models.UserDB.__table__, [
+            {"username": f"seed_user_{i}", "email": f"user{i}@seed.local", "hashed_password": password_hash, "role": "customer"}
+            for i in range(1, users + 1)
+        ] + [
+            {"username": f"seed_owner_{i}", "email": f"owner{i}@seed.local", "hashed_password": password_hash, "role": "restaurant"}
+            for i in range(1, owners + 1)
+        ])
+        log(f"users        {users + owners:>9,}  {time.perf_counter() - started:6.1f}s")
+
+        # A saved address for ~60% of customers, near one of the cities
+        locations = []
+        for user_id in range(1, users + 1):
+            if rng.random() < 0.6:
+                lat, lng = rng.choice(CITIES)
+                locations.append({
+                    "user_id": user_id, "address_label": "Home", "address_text": f"Ward {rng.randint(1, 32)}",
+                    "latitude": lat + rng.gauss(0, 0.05), "longitude": lng + rng.gauss(0, 0.05),
+                })
+        _insert(conn, models.UserLocationDB.__table__, locations)
+
+        rows = []
+        for i in range(1, restaurants + 1):
+            lat, lng = rng.choice(CITIES)
+            rows.append({
+                "name": f"{rng.choice(STYLES).title()} {rng.choice(['Kitchen', 'House', 'Corner', 'Express', 'Bhancha'])} {i}",
+                "cuisine_type": rng.choice(CUISINES),
+                "rating": round(rng.uniform(2.5, 5.0), 1),
+                "is_open": rng.random() < 0.8,
+                "latitude": lat + rng.gauss(0, 0.08),
+                "longitude": lng + rng.gauss(0, 0.08),
+                "owner_id": users + rng.randint(1, owners),
+            })
+        _insert(conn, models.RestaurantDB.__table__, rows)
+        log(f"restaurants  {restaurants:>9,}  {time.perf_counter() - started:6.1f}s")
+
+        # Menu sizes are skewed: a few big menus, many small ones
+        prices = {}
+        menus = {} # restaurant_id -> its menu item ids
+        rows = []
+        for item_id in range(1, menu_items + 1):
+            price = round(rng.uniform(80, 1500), 0)
+            prices[item_id] = price
+            restaurant_id = min(restaurants, int(rng.paretovariate(1.2))) if rng.random() < 0.2 else rng.randint(1, restaurants)
+            menus.setdefault(restaurant_id, []).append(item_id)
+            rows.append({
+                "name": _dish(rng),
+                "description": " ".join(rng.choice(FILLER) if rng.random() < 0.7 else rng.choice(DISHES) for _ in range(6)),
+                "price": price,
+                "restaurant_id": restaurant_id,
+            })
+            if len(rows) == BATCH:
+                _insert(conn, models.MenuItemDB.__table__, rows)
+                rows = []
+        _insert(conn, models.MenuItemDB.__table__, rows)
+        log(f"menu items   {menu_items:>9,}  {time.perf_counter() - started:6.1f}s")
+
+        # Order history: mostly delivered, a few still in flight. One restaurant per order.
+        now = time.time()
+        kitchens = sorted(menus)
+        order_rows, line_rows = [], []
+        for order_id in range(1, orders + 1):
+            restaurant_id = rng.choice(kitchens)
+            lines = {}
+            for _ in range(rng.randint(1, 4)):
+                item_id = rng.choice(menus[restaurant_id])
+                lines[item_id] = lines.get(item_id, 0) + rng.randint(1, 2)
+            status = "delivered" if rng.random() < 0.95 else rng.choice(["pending", "cooking", "ready", "cancelled"])
+            order_rows.append({
+                "customer_id": rng.randint(1, users),
+                "restaurant_id": restaurant_id,
+                "item_name": f"{len(lines)} items",
+                "quantity": sum(lines.values()),
+                "total_price": sum(prices[i] * q for i, q in lines.items()),
+                "status": status,
+                "next_transition_at": lifecycle.next_transition_at(status, now),
+            })
+            line_rows.extend(
+                {"order_id": order_id, "menu_item_id": i, "quantity": q, "item_name": "seeded", "unit_price": prices[i]}
+                for i, q in lines.items()
+            )
+            if len(order_rows) == BATCH:
+                _insert(conn, models.OrderDB.__table__, order_rows)
+                _insert(conn, models.OrderLineDB.__table__, line_rows)
+                order_rows, line_rows = [], []
+        _insert(conn, models.OrderDB.__table__, order_rows)
+        _insert(conn, models.OrderLineDB.__table__, line_rows)
+        log(f"orders       {orders:>9,}  {time.perf_counter() - started:6.1f}s")
+
+    with database.engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return {"users": users, "owners": owners, "restaurants": restaurants, "menu_items": menu_items, "orders": orders}
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("URBANPLATE_STORAGE_PROFILE", "fast") # Bulk load: no fsync per batch
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=SCALES, default="tiny")
+    parser.add_argument("--db", help="target file (default: URBANPLATE_DB_PATH)")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--restaurants", type=int)
+    parser.add_argument("--menu-items", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ["URBANPLATE_DB_PATH"] = args.db
+    elif "URBANPLATE_DB_PATH" not in os.environ:
+        sys.exit("Refusing to seed ./urbanplate.db: pass --db or set URBANPLATE_DB_PATH")
+    sizes = dict(SCALES[args.scale])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+    generate(**sizes, seed=args.seed)
@@ -0,0 +1,24 @@
+import zlib
+
+import pytest
+
+from apps import framing
+
+MESSAGE = {"id": 7, "sender_type": "user", "message": "momo is on the way", "timestamp": "2026-10-17T12:00:00"}
+
+
+@pytest.mark.parametrize("fmt", [fmt for fmt in framing.FORMATS if fmt.endswith("+deflate")])
+def test_deflate_formats_round_trip(fmt):
+    if not framing.supported(fmt):
+        pytest.skip("msgpack not installed")
+    for message in (MESSAGE, [MESSAGE, MESSAGE]):  # Single frame and a ?batch=1 array
+        frame = framing.encode(fmt, message)
+        assert isinstance(frame, bytes)
+        zlib.decompressobj(wbits=-15).decompress(frame)  # Raw DEFLATE, no zlib header
+        assert framing.decode(fmt, frame) == message
+
+
+def test_deflate_bomb_is_refused():
+    frame = framing.encode(framing.JSON + "+deflate", {"message": "x" * (framing.WS_MAX_INBOUND_BYTES * 2)})
+    with pytest.raises(ValueError):
+        framing.decode(framing.JSON + "+deflate", frame)